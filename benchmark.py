@@ -0,0 +1,482 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from telethon import events
+from telethon.errors.rpcerrorlist import ChatForwardsRestrictedError, FloodWaitError
+from telethon.tl.types import TypeMessageEntity
+
+import telegram_logic
+from telegram_logic import TelegramLogic
+
+BASE_DATE = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class FakeDocument:
+    def __init__(self, document_id: int, size: int):
+        self.id = document_id
+        self.size = size
+        self.attributes = []
+
+
+class FakeFile:
+    def __init__(self, size: int, ext: str = ".bin"):
+        self.size = size
+        self.ext = ext
+
+
+class FakeMessage:
+    __slots__ = (
+        "id",
+        "chat_id",
+        "peer_id",
+        "grouped_id",
+        "message",
+        "entities",
+        "media",
+        "document",
+        "photo",
+        "file",
+        "video",
+        "voice",
+        "video_note",
+        "date",
+    )
+
+    def __init__(
+        self,
+        message_id: int,
+        chat_id: int,
+        grouped_id: Optional[int] = None,
+        media_size: int = 0,
+    ):
+        self.id = message_id
+        self.chat_id = chat_id
+        self.peer_id = None
+        self.grouped_id = grouped_id
+        self.message = f"post {message_id}"
+        self.entities = None
+        self.document = FakeDocument(message_id, media_size) if media_size else None
+        self.media = self.document
+        self.photo = None
+        self.file = FakeFile(media_size) if media_size else None
+        self.video = None
+        self.voice = None
+        self.video_note = None
+        self.date = BASE_DATE + datetime.timedelta(minutes=message_id)
+
+
+class FakeTotalList(list):
+    total = 0
+
+
+class FakeEvent:
+    def __init__(self, messages: List[FakeMessage]):
+        self.messages = messages
+        self.message = messages[0]
+        self.chat_id = messages[0].chat_id
+
+
+class FakeSession:
+    takeout_id = None
+
+    def save(self):
+        return ""
+
+
+class FakeTakeout:
+    def __init__(self, client):
+        self.client = client
+
+    async def __aenter__(self):
+        return self.client
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class FakeTelegramClient:
+    def __init__(
+        self,
+        channels: Dict[int, int],
+        album_every: int = 0,
+        album_size: int = 5,
+        flood_every: int = 0,
+        flood_seconds: int = 1,
+        error_every: int = 0,
+        latency: float = 0.0,
+        protected: bool = False,
+        media_size: int = 0,
+    ):
+        self.channels = dict(channels)
+        self.protected = protected
+        self.media_size = media_size
+        self.downloaded_bytes = 0
+        self.connected = True
+        self.album_every = album_every
+        self.album_size = album_size
+        self.flood_every = flood_every
+        self.flood_seconds = flood_seconds
+        self.error_every = error_every
+        self.latency = latency
+        self.session = FakeSession()
+        self.calls: Counter = Counter()
+        self.forwarded = 0
+        self._target_ids: Counter = Counter()
+        self._handlers = []
+
+    def _grouped_id(self, chat_id: int, message_id: int) -> Optional[int]:
+        if not self.album_every:
+            return None
+        block = (message_id - 1) // self.album_every
+        if (message_id - 1) % self.album_every < self.album_size:
+            return abs(chat_id) * 1_000_000 + block
+        return None
+
+    def _message(self, chat_id: int, message_id: int) -> FakeMessage:
+        return FakeMessage(
+            message_id, chat_id, self._grouped_id(chat_id, message_id), self.media_size
+        )
+
+    async def _call(self, name: str):
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    def is_connected(self):
+        return self.connected
+
+    async def is_user_authorized(self):
+        return True
+
+    async def get_input_entity(self, peer):
+        return peer
+
+    async def get_entity(self, peer):
+        return peer
+
+    async def get_dialogs(self):
+        return []
+
+    def takeout(self, *args, **kwargs):
+        return FakeTakeout(self)
+
+    async def end_takeout(self, success: bool):
+        return True
+
+    async def get_messages(
+        self,
+        entity,
+        limit=100,
+        *,
+        offset_id: int = 0,
+        offset_date=None,
+        min_id: int = 0,
+        max_id: int = 0,
+        reverse: bool = False,
+        ids=None,
+        **kwargs,
+    ):
+        await self._call("get_messages")
+        top = self.channels.get(entity, 0)
+        if ids is not None:
+            single = isinstance(ids, int)
+            wanted = [ids] if single else list(ids)
+            found = [self._message(entity, i) if 0 < i <= top else None for i in wanted]
+            return found[0] if single else found
+
+        result = FakeTotalList()
+        result.total = top
+        if offset_date is not None:
+            if offset_date.tzinfo is None:
+                offset_date = offset_date.replace(tzinfo=datetime.timezone.utc)
+            minutes = int((offset_date - BASE_DATE).total_seconds() // 60)
+            date_id = max(0, min(top + 1, minutes))
+            offset_id = offset_id or (max(0, date_id - 1) if reverse else date_id)
+        if reverse:
+            start = max(offset_id, min_id) + 1
+            stop = min(top, max_id - 1 if max_id else top, start + (limit or 0) - 1)
+            ids_range = range(start, stop + 1)
+        else:
+            start = min(top, (offset_id - 1) if offset_id else top, (max_id - 1) if max_id else top)
+            stop = max(min_id + 1, start - (limit or 0) + 1, 1)
+            ids_range = range(start, stop - 1, -1)
+        result.extend(self._message(entity, message_id) for message_id in ids_range)
+        return result
+
+    async def iter_messages(self, entity, limit=None, **kwargs):
+        kwargs.setdefault("reverse", False)
+        yielded = 0
+        while limit is None or yielded < limit:
+            page = await self.get_messages(entity, limit=100, **kwargs)
+            if not page:
+                return
+            for message in page:
+                yield message
+                yielded += 1
+            kwargs["offset_id"] = page[-1].id
+            kwargs.pop("offset_date", None)
+
+    async def forward_messages(self, entity, messages, from_peer=None, **kwargs):
+        await self._call("forward_messages")
+        if self.flood_every and self.calls["forward_messages"] % self.flood_every == 0:
+            raise FloodWaitError(request=None, capture=self.flood_seconds)
+        if self.protected:
+            raise ChatForwardsRestrictedError(request=None)
+        single = not isinstance(messages, (list, tuple))
+        items = [messages] if single else list(messages)
+        ids = [getattr(item, "id", item) for item in items]
+        if self.error_every and any(message_id % self.error_every == 0 for message_id in ids):
+            raise ValueError("MESSAGE_ID_INVALID")
+        sent = []
+        for _ in ids:
+            self._target_ids[entity] += 1
+            sent.append(FakeMessage(self._target_ids[entity], entity))
+        self.forwarded += len(sent)
+        return sent[0] if single else sent
+
+    async def iter_download(self, media, offset=0, limit=None, request_size=512 * 1024, **kwargs):
+        await self._call("iter_download")
+        position = offset
+        for _ in range(limit or 1):
+            size = min(request_size, media.size - position)
+            if size <= 0:
+                return
+            self.downloaded_bytes += size
+            position += size
+            yield bytes(size)
+
+    def _sent(self, entity) -> FakeMessage:
+        self._target_ids[entity] += 1
+        self.forwarded += 1
+        return FakeMessage(self._target_ids[entity], entity, media_size=self.media_size)
+
+    async def send_message(self, entity, message="", **kwargs):
+        await self._call("send_message")
+        return self._sent(entity)
+
+    async def send_file(self, entity, file, caption=None, formatting_entities=None, **kwargs):
+        await self._call("send_file")
+        if isinstance(file, (list, tuple)):
+            groups = formatting_entities or []
+            if not all(isinstance(group, (list, tuple)) for group in groups):
+                groups = [groups]
+            if not all(isinstance(item, TypeMessageEntity) for group in groups for item in group):
+                raise TypeError("All entities must be instances of <types.TypeMessageEntity>")
+            return [self._sent(entity) for _ in file]
+        return self._sent(entity)
+
+    def add_event_handler(self, callback, event=None):
+        self._handlers.append((callback, event))
+
+    def remove_event_handler(self, callback, event=None):
+        self._handlers = [(cb, ev) for cb, ev in self._handlers if cb is not callback]
+
+    async def emit(self, chat_id: int, count: int):
+        first = self.channels.get(chat_id, 0) + 1
+        self.channels[chat_id] = first + count - 1
+        message_id = first
+        while message_id < first + count:
+            message = self._message(chat_id, message_id)
+            group = [message]
+            while (
+                message.grouped_id is not None
+                and message_id + len(group) < first + count
+                and self._grouped_id(chat_id, message_id + len(group)) == message.grouped_id
+            ):
+                group.append(self._message(chat_id, message_id + len(group)))
+            for callback, event in list(self._handlers):
+                if isinstance(event, events.Album) and message.grouped_id is not None:
+                    await callback(FakeEvent(group))
+                elif isinstance(event, events.NewMessage):
+                    for item in group:
+                        await callback(FakeEvent([item]))
+            message_id += len(group)
+
+
+def _peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class StateWriteTimer:
+    def __init__(self, logic: TelegramLogic):
+        self.writes = 0
+        self.seconds = 0.0
+        for store in (logic.checkpoints, logic.message_index):
+            store._write = self._wrap(store._write)
+
+    def _wrap(self, write):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return write(*args, **kwargs)
+            finally:
+                self.writes += 1
+                self.seconds += time.perf_counter() - started
+
+        return timed
+
+
+async def _wait_for(predicate, timeout: float):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError("Бенчмарк не дождался завершения.")
+        await asyncio.sleep(0.01)
+
+
+async def _run_scenario(args, logic: TelegramLogic, client: FakeTelegramClient):
+    sources = [-1000 - index for index in range(args.sources)]
+    targets = [-999 + index for index in range(args.targets)]
+    expected = args.messages * args.sources * len(targets)
+
+    if args.scenario == "archive":
+        await logic.checkpoints.start()
+        logic.session_pool.add("bench", client)
+        try:
+            await asyncio.gather(
+                *(logic._migrate_source(client, source, targets) for source in sources)
+            )
+        finally:
+            await logic.checkpoints.stop()
+        return expected
+
+    if args.scenario == "live":
+        expected = 0
+    run_task = asyncio.create_task(logic._run(sources, targets))
+    try:
+        await _wait_for(
+            lambda: len(logic._live_sources) == len(sources) * len(targets), args.timeout
+        )
+        if args.scenario == "live" or args.live:
+            live_count = args.live or args.messages
+            expected += live_count * args.sources * len(targets)
+            await asyncio.gather(*(client.emit(source, live_count) for source in sources))
+        await _wait_for(
+            lambda: client.forwarded >= expected - _skipped(args, expected), args.timeout
+        )
+    finally:
+        logic.stop()
+        await run_task
+    return expected
+
+
+def _skipped(args, expected: int) -> int:
+    return expected // args.error_every if args.error_every else 0
+
+
+def run_benchmark(args) -> dict:
+    channels = {-1000 - index: args.messages for index in range(args.sources)}
+    if args.scenario == "live":
+        channels = {source: 0 for source in channels}
+    client = FakeTelegramClient(
+        channels,
+        album_every=args.album_every,
+        flood_every=args.flood_every,
+        flood_seconds=args.flood_seconds,
+        error_every=args.error_every,
+        latency=args.latency,
+        protected=args.protected,
+        media_size=args.media_size,
+    )
+    workdir = tempfile.mkdtemp(prefix="cloner-bench-")
+    previous_dir = os.getcwd()
+    os.chdir(workdir)
+    telegram_logic.TelegramClient = lambda *a, **k: client
+    try:
+        logic = TelegramLogic(
+            api_id=1,
+            api_hash="bench",
+            batch_size=args.batch_size,
+            rate_limit=args.rate_limit,
+            parallelism=args.parallelism,
+            memory_session=args.memory_session,
+        )
+        logic.rate_limiter.burst = max(logic.rate_limiter.burst, args.rate_limit)
+        timer = StateWriteTimer(logic)
+        logic.is_running = True
+        started = time.perf_counter()
+        expected = asyncio.run(_run_scenario(args, logic, client))
+        elapsed = time.perf_counter() - started
+        logic.is_running = False
+        logic.checkpoints.close()
+        logic.message_index.close()
+    finally:
+        os.chdir(previous_dir)
+
+    api_calls = sum(client.calls.values())
+    return {
+        "scenario": args.scenario,
+        "messages": expected,
+        "forwarded": client.forwarded,
+        "seconds": round(elapsed, 3),
+        "messages_per_second": round(client.forwarded / elapsed, 1) if elapsed else 0.0,
+        "api_calls": dict(client.calls),
+        "api_calls_per_message": round(api_calls / max(1, client.forwarded), 4),
+        "downloaded_mb": round(client.downloaded_bytes / (1024 * 1024), 1),
+        "state_writes": timer.writes,
+        "state_write_seconds": round(timer.seconds, 3),
+        "state_write_share": round(timer.seconds / elapsed, 4) if elapsed else 0.0,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "workdir": workdir,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Офлайн-бенчмарк TelegramLogic на фейковом клиенте."
+    )
+    parser.add_argument("--scenario", choices=("archive", "run", "live"), default="archive")
+    parser.add_argument("--messages", type=int, default=10_000, help="Сообщений на источник.")
+    parser.add_argument("--sources", type=int, default=1)
+    parser.add_argument("--targets", type=int, default=1, help="Число каналов-получателей.")
+    parser.add_argument("--live", type=int, default=0, help="Живых постов на источник (run).")
+    parser.add_argument("--batch-size", type=int, default=TelegramLogic.MAX_FORWARD_BATCH)
+    parser.add_argument("--rate-limit", type=float, default=1_000_000.0)
+    parser.add_argument("--parallelism", type=int, default=3)
+    parser.add_argument("--album-every", type=int, default=0)
+    parser.add_argument("--flood-every", type=int, default=0)
+    parser.add_argument("--flood-seconds", type=int, default=1)
+    parser.add_argument("--error-every", type=int, default=0)
+    parser.add_argument("--protected", action="store_true", help="Источники запрещают пересылку.")
+    parser.add_argument("--media-size", type=int, default=0, help="Размер вложения, байт.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка API-вызова, с.")
+    parser.add_argument(
+        "--memory-session", action="store_true", help="Сессия в памяти с периодическим сбросом."
+    )
+    parser.add_argument("--timeout", type=float, default=3600.0)
+    parser.add_argument("--json", action="store_true", help="Вывести результат в JSON.")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    result = run_benchmark(args)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        for key, value in result.items():
+            print(f"{key:>24}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import asyncio
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+
+class CheckpointStore:
+    def __init__(self, path: str, flush_interval: float = 2.0, flush_every: int = 500):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._pending: Dict[str, int] = {}
+        self._pending_updates = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS progress ("
+                "source TEXT PRIMARY KEY, message_id INTEGER NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            row = self._connection().execute("SELECT 1 FROM progress LIMIT 1").fetchone()
+        return row is None
+
+    def load(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connection().execute("SELECT source, message_id FROM progress").fetchall()
+        progress = {source: message_id for source, message_id in rows}
+        progress.update(self._pending)
+        return progress
+
+    def import_progress(self, progress: Dict[str, int]) -> int:
+        items = [(str(source), int(message_id)) for source, message_id in progress.items()]
+        self._write(items)
+        return len(items)
+
+    def set(self, source: str, message_id: int):
+        self._pending[source] = message_id
+        self._pending_updates += 1
+        if self._wakeup and self._pending_updates >= self.flush_every:
+            self._wakeup.set()
+
+    def _write(self, items):
+        if not items:
+            return
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO progress (source, message_id) VALUES (?, ?) "
+                    "ON CONFLICT(source) DO UPDATE SET message_id = excluded.message_id",
+                    items,
+                )
+
+    def _take_pending(self):
+        items = list(self._pending.items())
+        self._pending = {}
+        self._pending_updates = 0
+        return items
+
+    def flush(self):
+        self._write(self._take_pending())
+
+    async def flush_async(self):
+        items = self._take_pending()
+        if items:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, items)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush_async()
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._wakeup = None
+        await self.flush_async()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
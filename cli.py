@@ -0,0 +1,262 @@
+import argparse
+import concurrent.futures
+import datetime
+import getpass
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+from typing import List, Optional
+
+try:
+    import termios
+except ImportError:
+    termios = None
+
+from filters import MessageFilter
+from log_pipeline import APP_LOGGER, setup_logging
+from telegram_logic import TelegramLogic
+
+logger = logging.getLogger(APP_LOGGER)
+
+LOGGING_DEFAULTS = {
+    "log_level": "INFO",
+    "log_file": "app.log",
+    "log_max_mb": 10,
+    "message_log_sample": 1,
+}
+
+
+def _parse_ids(value) -> List[int]:
+    if isinstance(value, list):
+        return [int(item) for item in value]
+    return [int(item.strip()) for item in str(value).split(",") if item.strip()]
+
+
+def _parse_date(value: Optional[str]) -> Optional[datetime.datetime]:
+    if not value:
+        return None
+    return datetime.datetime.strptime(value, "%d.%m.%Y")
+
+
+def _read_secret_file(path: str, stop_event: threading.Event, poll_interval: float = 2.0) -> str:
+    logger.info("Ожидаем файл %s...", path)
+    while not stop_event.is_set():
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                value = f.read().strip()
+            if value:
+                os.remove(path)
+                return value
+        stop_event.wait(poll_interval)
+    raise RuntimeError("Авторизация прервана.")
+
+
+def _read_stdin(prompt: str, secret: bool, stop_event: threading.Event) -> str:
+    answer = concurrent.futures.Future()
+    fd = sys.stdin.fileno()
+    saved_mode = termios.tcgetattr(fd) if termios and secret else None
+
+    def read():
+        try:
+            if secret:
+                answer.set_result(getpass.getpass(prompt))
+                return
+            sys.stdout.write(prompt)
+            sys.stdout.flush()
+            line = os.read(fd, 4096).decode(sys.stdin.encoding or "utf-8", "replace")
+            answer.set_result(line.strip())
+        except BaseException as exc:
+            answer.set_exception(exc)
+
+    threading.Thread(target=read, daemon=True).start()
+    while not stop_event.is_set():
+        try:
+            return answer.result(timeout=0.2)
+        except concurrent.futures.TimeoutError:
+            continue
+    if saved_mode is not None:
+        termios.tcsetattr(fd, termios.TCSANOW, saved_mode)
+    raise RuntimeError("Авторизация прервана.")
+
+
+class HeadlessAuth:
+    def __init__(self, phone=None, code_file=None, password_file=None):
+        self.phone = phone
+        self.code_file = code_file
+        self.password_file = password_file
+        self.stop_event = threading.Event()
+
+    def __call__(self, auth_type: str):
+        if auth_type == "phone" and self.phone:
+            return self.phone
+        if auth_type == "code" and self.code_file:
+            return _read_secret_file(self.code_file, self.stop_event)
+        if auth_type == "password" and self.password_file:
+            return _read_secret_file(self.password_file, self.stop_event)
+        if not sys.stdin or not sys.stdin.isatty():
+            raise RuntimeError(f"Нет источника для авторизации ({auth_type}).")
+        prompts = {
+            "phone": "Номер телефона: ",
+            "code": "Код подтверждения: ",
+            "password": "Пароль 2FA: ",
+        }
+        prompt = prompts.get(auth_type, "Введите данные: ")
+        return _read_stdin(prompt, auth_type == "password", self.stop_event)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="telegram-cloner",
+        description="Копирование каналов Telegram без графического интерфейса.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Скопировать архив и отслеживать новые посты.")
+    run.add_argument("--config", help="JSON-файл с параметрами (ключи совпадают с опциями).")
+    run.add_argument("--api-id")
+    run.add_argument("--api-hash")
+    run.add_argument("--sources", help="ID каналов-источников через запятую.")
+    run.add_argument("--target", help="ID каналов-получателей через запятую.")
+    run.add_argument("--from-date", help="Копировать с даты (дд.мм.гггг).")
+    run.add_argument("--sessions", help="Сессии аккаунтов через запятую.")
+    run.add_argument("--takeout", action="store_true", default=None)
+    run.add_argument("--batch-size", type=int)
+    run.add_argument("--rate-limit", type=float)
+    run.add_argument("--parallelism", type=int)
+    run.add_argument("--filters", help="JSON-файл с фильтрами сообщений.")
+    run.add_argument("--media-cache-mb", type=int, help="Размер кэша медиа для защищенных каналов.")
+    run.add_argument(
+        "--memory-session",
+        action="store_true",
+        default=None,
+        help="Держать сессию в памяти и сбрасывать на диск периодически.",
+    )
+    run.add_argument("--metrics-port", type=int, help="Порт Prometheus-метрик на 127.0.0.1.")
+    run.add_argument("--metrics-file", help="JSON-файл для периодического снимка метрик.")
+    run.add_argument("--phone", help="Номер телефона для авторизации.")
+    run.add_argument("--code-file", help="Файл, в который будет записан код подтверждения.")
+    run.add_argument("--password-file", help="Файл с паролем 2FA.")
+    run.add_argument("--log-level", help="Уровень журнала (по умолчанию INFO).")
+    run.add_argument("--log-file", help="JSON-журнал с ротацией по размеру (по умолчанию app.log).")
+    run.add_argument("--log-max-mb", type=float, help="Размер файла журнала до ротации (10 МБ).")
+    run.add_argument(
+        "--message-log-sample",
+        type=int,
+        help="Писать в журнал каждую N-ю отправку (0 — не писать, по умолчанию 1).",
+    )
+    return parser
+
+
+def merge_options(args: argparse.Namespace) -> dict:
+    options = {}
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            options.update(json.load(f))
+    for key, value in vars(args).items():
+        if value is not None and key not in ("config", "command"):
+            options[key] = value
+    for key, value in LOGGING_DEFAULTS.items():
+        options.setdefault(key, value)
+    return options
+
+
+def check_options(options: dict) -> dict:
+    missing = [key for key in ("api_id", "api_hash", "sources", "target") if not options.get(key)]
+    if missing:
+        raise ValueError(f"Не заданы параметры: {', '.join(missing)}")
+    filters = options.get("filters")
+    if isinstance(filters, str):
+        with open(filters, "r", encoding="utf-8") as f:
+            filters = json.load(f)
+    options["message_filter"] = MessageFilter.from_config(filters)
+    return options
+
+
+def load_options(args: argparse.Namespace) -> dict:
+    return check_options(merge_options(args))
+
+
+def run(options: dict) -> int:
+    logic_kwargs = {}
+    for key in (
+        "batch_size",
+        "rate_limit",
+        "parallelism",
+        "metrics_port",
+        "metrics_file",
+        "message_filter",
+        "media_cache_mb",
+        "memory_session",
+    ):
+        if options.get(key) is not None:
+            logic_kwargs[key] = options[key]
+    sessions = options.get("sessions")
+    if isinstance(sessions, str):
+        sessions = [item.strip() for item in sessions.split(",") if item.strip()]
+
+    auth = HeadlessAuth(
+        phone=options.get("phone"),
+        code_file=options.get("code_file"),
+        password_file=options.get("password_file"),
+    )
+    logic = TelegramLogic(
+        api_id=options["api_id"],
+        api_hash=options["api_hash"],
+        auth_callback=auth,
+        start_date=_parse_date(options.get("from_date")),
+        session_names=sessions or None,
+        use_takeout=bool(options.get("takeout")),
+        **logic_kwargs,
+    )
+
+    def handle_signal(signum, _frame):
+        logger.info("Получен сигнал %s, останавливаемся...", signal.Signals(signum).name)
+        auth.stop_event.set()
+        logic.stop()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    try:
+        logic.start_migration(_parse_ids(options["sources"]), _parse_ids(options["target"]))
+    except Exception:
+        return 1
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    error = None
+    try:
+        options = merge_options(args)
+    except (OSError, ValueError) as exc:
+        options = dict(LOGGING_DEFAULTS)
+        error = exc
+    listener = setup_logging(
+        level=options["log_level"],
+        log_file=options["log_file"],
+        max_mb=float(options["log_max_mb"]),
+        message_sample=int(options["message_log_sample"]),
+        console=True,
+    )
+    try:
+        if error is None:
+            try:
+                options = check_options(options)
+            except (OSError, ValueError) as exc:
+                error = exc
+        if error is not None:
+            logger.error("%s", error)
+            return 2
+        if args.command == "run":
+            return run(options)
+        return 2
+    finally:
+        listener.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+import asyncio
+import math
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+
+from telethon.tl.types import (
+    MessageMediaContact,
+    MessageMediaDice,
+    MessageMediaGeo,
+    MessageMediaGeoLive,
+    MessageMediaPoll,
+    MessageMediaVenue,
+    MessageMediaWebPage,
+)
+
+PASSTHROUGH_MEDIA = (
+    MessageMediaContact,
+    MessageMediaDice,
+    MessageMediaGeo,
+    MessageMediaGeoLive,
+    MessageMediaPoll,
+    MessageMediaVenue,
+)
+
+
+class MediaCache:
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._sizes: Optional["OrderedDict[str, int]"] = None
+        self._pinned: Dict[str, int] = {}
+
+    def _index(self) -> "OrderedDict[str, int]":
+        if self._sizes is None:
+            os.makedirs(self.directory, exist_ok=True)
+            entries = []
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if name.endswith(".part"):
+                    os.remove(path)
+                    continue
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name, stat.st_size))
+            self._sizes = OrderedDict((name, size) for _, name, size in sorted(entries))
+        return self._sizes
+
+    @property
+    def used_bytes(self) -> int:
+        return sum(self._index().values())
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def lookup(self, name: str) -> Optional[str]:
+        sizes = self._index()
+        if name not in sizes:
+            return None
+        path = self.path(name)
+        if not os.path.exists(path):
+            del sizes[name]
+            return None
+        sizes.move_to_end(name)
+        os.utime(path)
+        return path
+
+    def commit(self, name: str, temp_path: str) -> str:
+        sizes = self._index()
+        path = self.path(name)
+        os.replace(temp_path, path)
+        sizes[name] = os.path.getsize(path)
+        sizes.move_to_end(name)
+        self._evict()
+        return path
+
+    def pin(self, name: str):
+        self._pinned[name] = self._pinned.get(name, 0) + 1
+
+    def unpin(self, name: str):
+        count = self._pinned.get(name, 0) - 1
+        if count > 0:
+            self._pinned[name] = count
+        else:
+            self._pinned.pop(name, None)
+        self._evict()
+
+    def _evict(self):
+        sizes = self._index()
+        total = sum(sizes.values())
+        for name in list(sizes):
+            if total <= self.max_bytes:
+                break
+            if name in self._pinned:
+                continue
+            total -= sizes.pop(name)
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+
+
+class CopyEngine:
+    PART_SIZE = 512 * 1024
+    UPLOADED_MEMORY = 10_000
+
+    def __init__(
+        self,
+        cache_dir: str = "media_cache",
+        cache_size_mb: int = 2048,
+        download_workers: int = 3,
+        parts_per_file: int = 4,
+    ):
+        self.cache = MediaCache(cache_dir, int(cache_size_mb) * 1024 * 1024)
+        self.parts_per_file = max(1, int(parts_per_file))
+        self._downloads = asyncio.Semaphore(max(1, int(download_workers)))
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._uploaded: "OrderedDict[tuple, object]" = OrderedDict()
+        self.sources: Set[int] = set()
+
+    @staticmethod
+    def media_key(message) -> Optional[str]:
+        if message.document is not None:
+            return f"doc{message.document.id}"
+        if message.photo is not None:
+            return f"photo{message.photo.id}"
+        return None
+
+    def _file_name(self, message, key: str) -> str:
+        ext = message.file.ext if message.file else ""
+        return f"{key}{ext or ''}"
+
+    async def _download_range(self, client, message, path: str, first_part: int, parts: int):
+        position = first_part * self.PART_SIZE
+        with open(path, "r+b") as f:
+            f.seek(position)
+            async for chunk in client.iter_download(
+                message.media,
+                offset=position,
+                limit=parts,
+                request_size=self.PART_SIZE,
+                file_size=message.file.size,
+            ):
+                f.write(chunk)
+
+    async def _download(self, client, message, name: str) -> str:
+        cached = self.cache.lookup(name)
+        if cached:
+            return cached
+        temp_path = self.cache.path(f"{name}.part")
+        size = message.file.size or 0
+        total_parts = max(1, math.ceil(size / self.PART_SIZE))
+        workers = min(self.parts_per_file, total_parts)
+        per_worker = math.ceil(total_parts / workers)
+        async with self._downloads:
+            os.makedirs(self.cache.directory, exist_ok=True)
+            try:
+                if size:
+                    with open(temp_path, "wb") as f:
+                        f.truncate(size)
+                    await asyncio.gather(
+                        *(
+                            self._download_range(
+                                client,
+                                message,
+                                temp_path,
+                                first_part,
+                                min(per_worker, total_parts - first_part),
+                            )
+                            for first_part in range(0, total_parts, per_worker)
+                        )
+                    )
+                else:
+                    await client.download_media(message, file=temp_path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+        return self.cache.commit(name, temp_path)
+
+    async def _prepare_one(self, client, message):
+        media = message.media
+        if media is None or isinstance(media, MessageMediaWebPage):
+            return None
+        if isinstance(media, PASSTHROUGH_MEDIA):
+            return media
+        key = self.media_key(message)
+        if key is None:
+            raise ValueError(f"Тип вложения {type(media).__name__} нельзя скопировать")
+        name = self._file_name(message, key)
+        self.cache.pin(name)
+        try:
+            download = self._in_flight.get(name)
+            if download is None:
+                download = asyncio.ensure_future(self._download(client, message, name))
+                self._in_flight[name] = download
+                download.add_done_callback(lambda _: self._in_flight.pop(name, None))
+            return await asyncio.shield(download)
+        except BaseException:
+            self.cache.unpin(name)
+            raise
+
+    async def prepare(self, client, messages) -> List[object]:
+        files = await asyncio.gather(
+            *(self._prepare_one(client, message) for message in messages),
+            return_exceptions=True,
+        )
+        errors = [file for file in files if isinstance(file, BaseException)]
+        if errors:
+            self.release(messages, files)
+            raise errors[0]
+        return list(files)
+
+    def release(self, messages, files):
+        for message, file in zip(messages, files):
+            if isinstance(file, str):
+                self.cache.unpin(os.path.basename(file))
+
+    def _reuse(self, account: str, message, file):
+        if not isinstance(file, str):
+            return file
+        key = (account, self.media_key(message))
+        uploaded = self._uploaded.get(key)
+        if uploaded is None:
+            return file
+        self._uploaded.move_to_end(key)
+        return uploaded
+
+    def _remember(self, account: str, message, sent):
+        key = self.media_key(message)
+        if key is None or sent is None or sent.media is None:
+            return
+        key = (account, key)
+        self._uploaded[key] = sent.media
+        self._uploaded.move_to_end(key)
+        while len(self._uploaded) > self.UPLOADED_MEMORY:
+            self._uploaded.popitem(last=False)
+
+    async def send(self, client, messages, files, target_id: int, account: str) -> list:
+        files = [self._reuse(account, message, file) for message, file in zip(messages, files)]
+        first = messages[0]
+        if len(messages) == 1 and files[0] is None:
+            sent = await client.send_message(
+                target_id,
+                first.message or "",
+                formatting_entities=first.entities,
+                link_preview=isinstance(first.media, MessageMediaWebPage),
+            )
+            return [sent]
+        if len(messages) == 1:
+            document = first.document
+            sent = await client.send_file(
+                target_id,
+                files[0],
+                caption=first.message or "",
+                formatting_entities=first.entities,
+                attributes=document.attributes if document is not None else None,
+                supports_streaming=bool(first.video),
+                voice_note=bool(first.voice),
+                video_note=bool(first.video_note),
+            )
+            result = [sent]
+        else:
+            sent = await client.send_file(
+                target_id,
+                files,
+                caption=[message.message or "" for message in messages],
+                formatting_entities=[message.entities or [] for message in messages],
+                supports_streaming=True,
+            )
+            result = list(sent) if isinstance(sent, list) else [sent]
+            result += [None] * (len(messages) - len(result))
+        for message, target_message in zip(messages, result):
+            self._remember(account, message, target_message)
+        return result
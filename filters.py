@@ -0,0 +1,228 @@
+import datetime
+import re
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from telethon.tl.types import (
+    InputMessagesFilterDocument,
+    InputMessagesFilterGif,
+    InputMessagesFilterMusic,
+    InputMessagesFilterPhotos,
+    InputMessagesFilterPhotoVideo,
+    InputMessagesFilterRoundVideo,
+    InputMessagesFilterVideo,
+    InputMessagesFilterVoice,
+)
+
+MEDIA_TYPES = (
+    "text",
+    "sticker",
+    "poll",
+    "gif",
+    "round",
+    "voice",
+    "music",
+    "video",
+    "photo",
+    "contact",
+    "geo",
+    "dice",
+    "webpage",
+    "document",
+    "other",
+)
+
+SERVER_FILTERS = {
+    frozenset({"photo"}): InputMessagesFilterPhotos,
+    frozenset({"video"}): InputMessagesFilterVideo,
+    frozenset({"photo", "video"}): InputMessagesFilterPhotoVideo,
+    frozenset({"gif"}): InputMessagesFilterGif,
+    frozenset({"round"}): InputMessagesFilterRoundVideo,
+    frozenset({"voice"}): InputMessagesFilterVoice,
+    frozenset({"music"}): InputMessagesFilterMusic,
+    frozenset({"document"}): InputMessagesFilterDocument,
+}
+
+
+def media_type(message) -> str:
+    if message.media is None:
+        return "text"
+    for name, attribute in (
+        ("sticker", "sticker"),
+        ("poll", "poll"),
+        ("gif", "gif"),
+        ("round", "video_note"),
+        ("voice", "voice"),
+        ("music", "audio"),
+        ("video", "video"),
+        ("photo", "photo"),
+        ("contact", "contact"),
+        ("geo", "geo"),
+        ("dice", "dice"),
+        ("webpage", "web_preview"),
+        ("document", "document"),
+    ):
+        if getattr(message, attribute, None):
+            return name
+    return "other"
+
+
+def _parse_date(value, end_of_day: bool = False) -> Optional[datetime.datetime]:
+    if not value:
+        return None
+    if not isinstance(value, datetime.datetime):
+        try:
+            value = datetime.datetime.strptime(str(value), "%d.%m.%Y")
+        except ValueError:
+            raise ValueError(f"Некорректная дата в фильтре: {value} (ожидается дд.мм.гггг)")
+        if end_of_day:
+            value += datetime.timedelta(days=1)
+    elif end_of_day:
+        value += datetime.timedelta(microseconds=1)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value
+
+
+def _media_set(values: Optional[Iterable[str]], option: str) -> Optional[frozenset]:
+    if values is None:
+        return None
+    if isinstance(values, str):
+        values = [item.strip() for item in values.split(",") if item.strip()]
+    media = frozenset(str(value).lower() for value in values)
+    unknown = sorted(media - set(MEDIA_TYPES))
+    if unknown:
+        raise ValueError(f"Неизвестные типы сообщений в {option}: {', '.join(unknown)}")
+    return media
+
+
+def _patterns(values, option: str) -> List["re.Pattern"]:
+    if not values:
+        return []
+    if isinstance(values, str):
+        values = [values]
+    try:
+        return [re.compile(value, re.IGNORECASE) for value in values]
+    except re.error as exc:
+        raise ValueError(f"Некорректное регулярное выражение в {option}: {exc}")
+
+
+class FilteredOut:
+    def __init__(self, message):
+        self.id = message.id
+        self.grouped_id = message.grouped_id
+
+
+class MessageFilter:
+    ALBUM_MEMORY = 1024
+
+    def __init__(
+        self,
+        include_media=None,
+        exclude_media=None,
+        include=None,
+        exclude=None,
+        min_date=None,
+        max_date=None,
+        min_views: Optional[int] = None,
+        max_views: Optional[int] = None,
+        min_size_mb: Optional[float] = None,
+        max_size_mb: Optional[float] = None,
+        search: Optional[str] = None,
+    ):
+        self.include_media = _media_set(include_media, "include_media")
+        self.exclude_media = _media_set(exclude_media, "exclude_media") or frozenset()
+        self.include = _patterns(include, "include")
+        self.exclude = _patterns(exclude, "exclude")
+        self.min_date = _parse_date(min_date)
+        self.max_date = _parse_date(max_date, end_of_day=True)
+        self.min_views = min_views
+        self.max_views = max_views
+        self.min_size = int(min_size_mb * 1024 * 1024) if min_size_mb is not None else None
+        self.max_size = int(max_size_mb * 1024 * 1024) if max_size_mb is not None else None
+        self.search = search or None
+        self._search_text = self.search.casefold() if self.search else None
+        self._album_verdicts: "OrderedDict[int, bool]" = OrderedDict()
+        self._search_verdicts: "OrderedDict[int, bool]" = OrderedDict()
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict]) -> Optional["MessageFilter"]:
+        if not config:
+            return None
+        try:
+            return cls(**config)
+        except TypeError as exc:
+            raise ValueError(f"Некорректные параметры фильтров: {exc}")
+
+    def server_kwargs(self) -> Dict:
+        kwargs = {}
+        server_filter = SERVER_FILTERS.get(self.include_media or frozenset())
+        if server_filter:
+            kwargs["filter"] = server_filter
+        if self.search:
+            kwargs["search"] = self.search
+        return kwargs
+
+    def past_max_date(self, message) -> bool:
+        return self.max_date is not None and message.date >= self.max_date
+
+    def _text_accepted(self, text: str) -> bool:
+        if self.include and not any(pattern.search(text) for pattern in self.include):
+            return False
+        return not any(pattern.search(text) for pattern in self.exclude)
+
+    def _album_text_accepted(self, message) -> bool:
+        text = message.message or ""
+        grouped_id = message.grouped_id
+        if grouped_id is None:
+            return self._text_accepted(text)
+        if not text and grouped_id in self._album_verdicts:
+            return self._album_verdicts[grouped_id]
+        verdict = self._text_accepted(text)
+        self._album_verdicts[grouped_id] = verdict
+        if len(self._album_verdicts) > self.ALBUM_MEMORY:
+            self._album_verdicts.popitem(last=False)
+        return verdict
+
+    def _search_accepted(self, message) -> bool:
+        if self._search_text is None:
+            return True
+        text = message.message or ""
+        grouped_id = message.grouped_id
+        if grouped_id is not None and not text:
+            return self._search_verdicts.get(grouped_id, False)
+        verdict = self._search_text in text.casefold()
+        if grouped_id is not None:
+            self._search_verdicts[grouped_id] = verdict
+            if len(self._search_verdicts) > self.ALBUM_MEMORY:
+                self._search_verdicts.popitem(last=False)
+        return verdict
+
+    def accepts(self, message) -> bool:
+        if not self._album_text_accepted(message):
+            return False
+        if not self._search_accepted(message):
+            return False
+        kind = media_type(message)
+        if self.include_media is not None and kind not in self.include_media:
+            return False
+        if kind in self.exclude_media:
+            return False
+        if self.min_date is not None and message.date < self.min_date:
+            return False
+        if self.past_max_date(message):
+            return False
+        if self.min_views is not None or self.max_views is not None:
+            views = getattr(message, "views", None) or 0
+            if self.min_views is not None and views < self.min_views:
+                return False
+            if self.max_views is not None and views > self.max_views:
+                return False
+        if self.min_size is not None or self.max_size is not None:
+            file = getattr(message, "file", None)
+            size = (file.size if file else None) or 0
+            if self.min_size is not None and size < self.min_size:
+                return False
+            if self.max_size is not None and size > self.max_size:
+                return False
+        return True
@@ -1,4 +1,6 @@
+import re
 import tkinter.messagebox as messagebox
+from collections import deque
 from tkcalendar import DateEntry
 import customtkinter as ctk
 
@@ -48,8 +50,13 @@ class AuthDialog(ctk.CTkToplevel):
 
 
 class App(ctk.CTk):
+    LOG_MAX_LINES = 2000
+    LOG_NUMBER_RE = re.compile(r"(?<!\s-)(?<!\d)\d+")
+
     def __init__(self):
         super().__init__()
+        self._log_entries = deque(maxlen=self.LOG_MAX_LINES)
+        self._log_line_count = 0
         self.title("Telegram Cloner App")
         self.geometry("820x700")
         self.resizable(False, False)
@@ -77,11 +84,22 @@ class App(ctk.CTk):
         self.source_ids_entry = ctk.CTkEntry(self.settings_frame, placeholder_text="-100111,-100222")
         self.source_ids_entry.grid(row=2, column=1, padx=10, pady=10, sticky="ew")
 
-        self.target_id_label = ctk.CTkLabel(self.settings_frame, text="ID Вашего Канала:")
+        self.target_id_label = ctk.CTkLabel(
+            self.settings_frame, text="ID Ваших Каналов (через запятую):"
+        )
         self.target_id_label.grid(row=3, column=0, padx=10, pady=10, sticky="w")
-        self.target_id_entry = ctk.CTkEntry(self.settings_frame, placeholder_text="-100333")
+        self.target_id_entry = ctk.CTkEntry(self.settings_frame, placeholder_text="-100333,-100444")
         self.target_id_entry.grid(row=3, column=1, padx=10, pady=10, sticky="ew")
 
+        self.sessions_label = ctk.CTkLabel(
+            self.settings_frame, text="Сессии аккаунтов (через запятую):"
+        )
+        self.sessions_label.grid(row=4, column=0, padx=10, pady=10, sticky="w")
+        self.sessions_entry = ctk.CTkEntry(
+            self.settings_frame, placeholder_text="cloner_session,second_account"
+        )
+        self.sessions_entry.grid(row=4, column=1, padx=10, pady=10, sticky="ew")
+
         self.date_frame = ctk.CTkFrame(self)
         self.date_frame.pack(padx=20, pady=(0, 10), fill="x")
 
@@ -111,6 +129,14 @@ class App(ctk.CTk):
         )
         self.save_creds_check.pack(padx=20, pady=(0, 10), anchor="w")
 
+        self.takeout_var = ctk.BooleanVar()
+        self.takeout_check = ctk.CTkCheckBox(
+            self,
+            text="Читать архив через takeout-сессию (мягче лимиты, нужно подтверждение)",
+            variable=self.takeout_var,
+        )
+        self.takeout_check.pack(padx=20, pady=(0, 10), anchor="w")
+
         self.buttons_frame = ctk.CTkFrame(self)
         self.buttons_frame.pack(padx=20, pady=5, fill="x")
 
@@ -133,6 +159,9 @@ class App(ctk.CTk):
         )
         self.start_migration_button.pack(side="left", padx=5, fill="x", expand=True)
 
+        self.stats_label = ctk.CTkLabel(self, text="", anchor="w", justify="left")
+        self.stats_label.pack(padx=20, pady=(10, 0), fill="x")
+
         self.log_textbox = ctk.CTkTextbox(self, state="disabled", wrap="word")
         self.log_textbox.pack(padx=20, pady=20, fill="both", expand=True)
 
@@ -148,11 +177,53 @@ class App(ctk.CTk):
         return dialog.result
 
     def append_log(self, message: str):
+        self.append_logs([message])
+
+    @staticmethod
+    def _format_log_entry(entry) -> str:
+        _, message, count = entry
+        return message if count == 1 else f"{message} (×{count})"
+
+    def append_logs(self, messages):
+        if not messages:
+            return
+        replace_last = False
+        added = 0
+        for message in messages:
+            template = self.LOG_NUMBER_RE.sub("#", message)
+            if self._log_entries and self._log_entries[-1][0] == template:
+                self._log_entries[-1][1] = message
+                self._log_entries[-1][2] += 1
+                replace_last = replace_last or added == 0
+            else:
+                self._log_entries.append([template, message, 1])
+                added += 1
+
         self.log_textbox.configure(state="normal")
-        self.log_textbox.insert("end", f"{message}\n")
+        if added + replace_last >= len(self._log_entries):
+            self.log_textbox.delete("1.0", "end")
+            self._log_line_count = 0
+            rendered = list(self._log_entries)
+        else:
+            if replace_last:
+                last_line = self._log_line_count
+                self.log_textbox.delete(f"{last_line}.0", f"{last_line + 1}.0")
+                self._log_line_count -= 1
+            rendered = list(self._log_entries)[-(added + replace_last):]
+        self.log_textbox.insert(
+            "end", "".join(f"{self._format_log_entry(entry)}\n" for entry in rendered)
+        )
+        self._log_line_count += len(rendered)
+        excess = self._log_line_count - self.LOG_MAX_LINES
+        if excess > 0:
+            self.log_textbox.delete("1.0", f"{excess + 1}.0")
+            self._log_line_count -= excess
         self.log_textbox.configure(state="disabled")
         self.log_textbox.see("end")
 
+    def update_stats(self, text: str):
+        self.stats_label.configure(text=text)
+
     def toggle_action_buttons(self, is_running: bool):
         if is_running:
             self.start_migration_button.configure(state="disabled")
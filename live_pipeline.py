@@ -0,0 +1,77 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List
+
+ForwardCallback = Callable[[int, list], Awaitable[None]]
+
+
+class LivePipeline:
+    def __init__(
+        self,
+        forward: ForwardCallback,
+        workers: int = 4,
+        maxsize: int = 1000,
+        max_batch: int = 100,
+    ):
+        self._forward = forward
+        self.max_batch = max_batch
+        self._shards: List[asyncio.Queue] = [
+            asyncio.Queue(max(1, maxsize // max(1, workers))) for _ in range(max(1, workers))
+        ]
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def depth(self) -> int:
+        return sum(shard.qsize() for shard in self._shards)
+
+    @property
+    def capacity(self) -> int:
+        return sum(shard.maxsize for shard in self._shards)
+
+    def _shard(self, source_id: int) -> asyncio.Queue:
+        return self._shards[hash(source_id) % len(self._shards)]
+
+    async def put(self, source_id: int, messages: list):
+        await self._shard(source_id).put((source_id, messages))
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker(shard)) for shard in self._shards]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _drain(self, shard: asyncio.Queue, first) -> Dict[int, List[list]]:
+        pending: Dict[int, List[list]] = {}
+        source_id, messages = first
+        pending.setdefault(source_id, []).append(messages)
+        taken = len(messages)
+        while taken < self.max_batch and not shard.empty():
+            source_id, messages = shard.get_nowait()
+            pending.setdefault(source_id, []).append(messages)
+            taken += len(messages)
+        return pending
+
+    def _batches(self, groups: List[list]):
+        batch: list = []
+        for messages in groups:
+            if batch and len(batch) + len(messages) > self.max_batch:
+                yield batch
+                batch = []
+            batch.extend(messages)
+        if batch:
+            yield batch
+
+    async def _worker(self, shard: asyncio.Queue):
+        while True:
+            first = await shard.get()
+            pending = self._drain(shard, first)
+            try:
+                for source_id, groups in pending.items():
+                    for batch in self._batches(groups):
+                        await self._forward(source_id, batch)
+            finally:
+                for groups in pending.values():
+                    for _ in groups:
+                        shard.task_done()
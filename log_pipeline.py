@@ -0,0 +1,100 @@
+import datetime
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+from typing import List, Optional
+
+APP_LOGGER = "TelegramCloner"
+MESSAGE_LOGGER = "TelegramCloner.messages"
+RECORD_FIELDS = ("event", "source", "target", "message_id", "count", "latency", "outcome", "error")
+CONSOLE_FORMAT = "%(asctime)s %(levelname)s %(message)s"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in RECORD_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class MessageSampler(logging.Filter):
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, int(every))
+        self._counter = itertools.count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return next(self._counter) % self.every == 0
+
+
+class AppRecordsOnly(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.name.startswith(APP_LOGGER) and record.name != MESSAGE_LOGGER
+
+
+class GuiLogHandler(logging.Handler):
+    def __init__(self, target_queue: queue.Queue):
+        super().__init__(logging.INFO)
+        self.target_queue = target_queue
+        self.addFilter(AppRecordsOnly())
+
+    def emit(self, record: logging.LogRecord):
+        self.target_queue.put(record.getMessage())
+
+
+def setup_logging(
+    level: str = "INFO",
+    log_file: Optional[str] = "app.log",
+    max_mb: float = 10,
+    backups: int = 5,
+    message_sample: int = 1,
+    console: bool = False,
+    handlers: Optional[List[logging.Handler]] = None,
+) -> logging.handlers.QueueListener:
+    targets = list(handlers or [])
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file,
+            maxBytes=int(max_mb * 1024 * 1024),
+            backupCount=backups,
+            encoding="utf-8",
+        )
+        file_handler.setFormatter(JsonFormatter())
+        targets.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        console_handler.addFilter(lambda record: record.name != MESSAGE_LOGGER)
+        targets.append(console_handler)
+
+    records = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(records))
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+
+    message_logger = logging.getLogger(MESSAGE_LOGGER)
+    for old_filter in list(message_logger.filters):
+        message_logger.removeFilter(old_filter)
+    if message_sample and int(message_sample) > 0:
+        message_logger.setLevel(logging.NOTSET)
+        message_logger.addFilter(MessageSampler(message_sample))
+    else:
+        message_logger.setLevel(logging.CRITICAL + 1)
+
+    listener = logging.handlers.QueueListener(records, *targets, respect_handler_level=True)
+    listener.start()
+    return listener
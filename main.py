@@ -1,54 +1,53 @@
-import asyncio
 import datetime
 import json
 import logging
 import os
 import queue
+import sys
 import threading
-import tkinter.messagebox as messagebox
-from cryptography.fernet import Fernet
+from typing import TYPE_CHECKING
 
-from gui import App
+from log_pipeline import APP_LOGGER, GuiLogHandler, setup_logging
 from telegram_logic import TelegramLogic
 
-logging.basicConfig(
-    filename="app.log",
-    level=logging.INFO,
-    format="%(asctime)s %(levelname)s %(message)s",
-    encoding="utf-8",
-)
+if TYPE_CHECKING:
+    from gui import App
 
 
 class AppController:
     KEY_FILE = "app.key"
     CREDS_FILE = "credentials.json"
+    LOG_BATCH_LIMIT = 500
 
-    def __init__(self, app_instance: App):
+    def __init__(self, app_instance: "App", log_queue: queue.Queue = None):
         self.app = app_instance
-        self.log_queue = queue.Queue()
+        self.log_queue = log_queue or queue.Queue()
         self.logic = None
         self.thread = None
-        self.logger = logging.getLogger("TelegramCloner")
+        self.logger = logging.getLogger(APP_LOGGER)
 
         self._load_credentials()
         self.app.start_migration_button.configure(command=self.start_migration)
         self.app.stop_migration_button.configure(command=self.stop_migration)
         self.app.after(100, self.process_log_queue)
+        self.app.after(1000, self.refresh_stats)
+
+    def _fernet(self):
+        from cryptography.fernet import Fernet
 
-    def _load_key(self):
         if os.path.exists(self.KEY_FILE):
             with open(self.KEY_FILE, "rb") as f:
-                return f.read()
+                return Fernet(f.read())
         key = Fernet.generate_key()
         with open(self.KEY_FILE, "wb") as f:
             f.write(key)
-        return key
+        return Fernet(key)
 
     def _encrypt(self, data: str) -> str:
-        return Fernet(self._load_key()).encrypt(data.encode()).decode()
+        return self._fernet().encrypt(data.encode()).decode()
 
     def _decrypt(self, data: str) -> str:
-        return Fernet(self._load_key()).decrypt(data.encode()).decode()
+        return self._fernet().decrypt(data.encode()).decode()
 
     def _save_credentials(self):
         if self.app.save_creds_var.get():
@@ -57,6 +56,7 @@ class AppController:
                 "api_hash": self._encrypt(self.app.api_hash_entry.get()),
                 "source_ids": self.app.source_ids_entry.get(),
                 "target_id": self.app.target_id_entry.get(),
+                "sessions": self.app.sessions_entry.get(),
             }
             with open(self.CREDS_FILE, "w", encoding="utf-8") as f:
                 json.dump(creds, f)
@@ -76,25 +76,34 @@ class AppController:
                 self.app.source_ids_entry.insert(0, data.get("source_ids", ""))
                 self.app.target_id_entry.delete(0, "end")
                 self.app.target_id_entry.insert(0, data.get("target_id", ""))
+                self.app.sessions_entry.delete(0, "end")
+                self.app.sessions_entry.insert(0, data.get("sessions", ""))
                 self.app.save_creds_var.set(True)
             except Exception as exc:
-                self.logger.error("Ошибка загрузки credentials: %s", exc)
                 self._log(f"Ошибка загрузки сохранённых данных: {exc}", level="error")
 
     def _log(self, message, level="info"):
-        self.log_queue.put(message)
         getattr(self.logger, level)(message)
 
     def process_log_queue(self):
+        messages = []
         try:
-            while True:
-                message = self.log_queue.get_nowait()
-                self.app.append_log(message)
+            while len(messages) < self.LOG_BATCH_LIMIT:
+                messages.append(self.log_queue.get_nowait())
         except queue.Empty:
             pass
+        try:
+            self.app.append_logs(messages)
         finally:
             self.app.after(100, self.process_log_queue)
 
+    def refresh_stats(self):
+        try:
+            if self.logic:
+                self.app.update_stats(self.logic.status())
+        finally:
+            self.app.after(1000, self.refresh_stats)
+
     def _threadsafe_auth_dialog(self, auth_type):
         result_holder = {"value": None}
         event = threading.Event()
@@ -110,6 +119,8 @@ class AppController:
         return result_holder["value"]
 
     def start_migration(self):
+        import tkinter.messagebox as messagebox
+
         if self.thread and self.thread.is_alive():
             self._log("Миграция уже выполняется.", level="warning")
             return
@@ -137,11 +148,15 @@ class AppController:
             return
 
         try:
-            target_id = int(target_text)
+            target_ids = [int(item.strip()) for item in target_text.split(",") if item.strip()]
         except ValueError:
-            messagebox.showerror("Ошибка", "ID целевого канала должен быть числом.")
+            messagebox.showerror("Ошибка", "ID целевых каналов должны быть числами.")
             return
 
+        session_names = [
+            item.strip() for item in self.app.sessions_entry.get().split(",") if item.strip()
+        ]
+
         start_date = None
         if self.app.date_checkbox.get() == 1:
             selected_date = self.app.date_entry.get_date()
@@ -152,22 +167,23 @@ class AppController:
         self.logic = TelegramLogic(
             api_id=self.app.api_id_entry.get(),
             api_hash=self.app.api_hash_entry.get(),
-            log_callback=self.log_queue.put,
             auth_callback=self._threadsafe_auth_dialog,
             start_date=start_date,
+            session_names=session_names or None,
+            use_takeout=self.app.takeout_var.get(),
         )
         self.app.toggle_action_buttons(True)
         self._log("Запуск миграции...")
         self.thread = threading.Thread(
             target=self._run_logic,
-            args=(source_ids, target_id),
+            args=(source_ids, target_ids),
             daemon=True,
         )
         self.thread.start()
 
-    def _run_logic(self, source_ids, target_id):
+    def _run_logic(self, source_ids, target_ids):
         try:
-            self.logic.start_migration(source_ids, target_id)
+            self.logic.start_migration(source_ids, target_ids)
         except Exception as exc:
             self._log(f"Критическая ошибка: {exc}", level="error")
             self.app.after(0, lambda: self.app.show_error("Ошибка запуска миграции", str(exc)))
@@ -182,7 +198,22 @@ class AppController:
             self._log("Миграция не была запущена.", level="warning")
 
 
+def run_gui():
+    from gui import App
+
+    log_queue = queue.Queue()
+    listener = setup_logging(log_file="app.log", handlers=[GuiLogHandler(log_queue)])
+    try:
+        app_gui = App()
+        AppController(app_gui, log_queue)
+        app_gui.mainloop()
+    finally:
+        listener.stop()
+
+
 if __name__ == "__main__":
-    app_gui = App()
-    AppController(app_gui)
-    app_gui.mainloop()
\ No newline at end of file
+    if len(sys.argv) > 1:
+        from cli import main as cli_main
+
+        sys.exit(cli_main())
+    run_gui()
\ No newline at end of file
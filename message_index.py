@@ -0,0 +1,125 @@
+import asyncio
+import hashlib
+import math
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+Key = Tuple[int, int, int]
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(self.size // 8 + 1)
+
+    def _positions(self, key: Key):
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, key: Key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: Key) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key)
+        )
+
+
+class MessageIndex:
+    def __init__(self, path: str, expected_messages: int = 1_000_000):
+        self.path = path
+        self.expected_messages = expected_messages
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._bloom: Optional[BloomFilter] = None
+        self._unsaved: Dict[Key, int] = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS message_map ("
+                "source_chat INTEGER NOT NULL, source_msg_id INTEGER NOT NULL, "
+                "target_chat INTEGER NOT NULL, target_msg_id INTEGER NOT NULL, "
+                "PRIMARY KEY (source_chat, source_msg_id, target_chat)) WITHOUT ROWID"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def open(self) -> int:
+        with self._lock:
+            conn = self._connection()
+            count = conn.execute("SELECT COUNT(*) FROM message_map").fetchone()[0]
+            bloom = BloomFilter(max(self.expected_messages, count * 2))
+            rows = conn.execute("SELECT source_chat, source_msg_id, target_chat FROM message_map")
+            for row in rows:
+                bloom.add(row)
+            self._bloom = bloom
+        return count
+
+    def contains(self, source_chat: int, source_msg_id: int, target_chat: int) -> bool:
+        key = (source_chat, source_msg_id, target_chat)
+        if self._bloom is None:
+            self.open()
+        if key not in self._bloom:
+            return False
+        if key in self._unsaved:
+            return True
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT 1 FROM message_map "
+                "WHERE source_chat = ? AND source_msg_id = ? AND target_chat = ?",
+                key,
+            ).fetchone()
+        return row is not None
+
+    def _write(self, rows: List[Tuple[int, int, int, int]]):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO message_map "
+                    "(source_chat, source_msg_id, target_chat, target_msg_id) VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+
+    async def record(
+        self,
+        source_chat: int,
+        source_msg_ids: Sequence[int],
+        target_msg_ids: Sequence[int],
+        target_chat: int,
+    ):
+        if self._bloom is None:
+            self.open()
+        rows = []
+        for source_msg_id, target_msg_id in zip(source_msg_ids, target_msg_ids):
+            if target_msg_id is None:
+                continue
+            key = (source_chat, source_msg_id, target_chat)
+            self._bloom.add(key)
+            self._unsaved[key] = target_msg_id
+            rows.append((*key, target_msg_id))
+        if not rows:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, rows)
+        finally:
+            for row in rows:
+                self._unsaved.pop(row[:3], None)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._bloom = None
@@ -0,0 +1,242 @@
+import asyncio
+import bisect
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Dict, Optional, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = list(key) + sorted((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Histogram:
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else float("inf")
+        return float("inf")
+
+
+class Metrics:
+    RATE_WINDOW = 60.0
+
+    def __init__(self):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[LabelKey, float]] = defaultdict(lambda: defaultdict(float))
+        self.gauges: Dict[str, Dict[LabelKey, float]] = defaultdict(dict)
+        self.histograms: Dict[str, Dict[LabelKey, Histogram]] = defaultdict(dict)
+        self._recent: Dict[str, deque] = defaultdict(deque)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        with self._lock:
+            self.counters[name][_label_key(labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self.gauges[name][_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            histogram = self.histograms[name].get(key)
+            if histogram is None:
+                histogram = self.histograms[name][key] = Histogram()
+            histogram.observe(value)
+
+    def record_forwarded(self, source_id, count: int):
+        now = time.monotonic()
+        with self._lock:
+            key = _label_key({"source": source_id})
+            self.counters["cloner_messages_forwarded_total"][key] += count
+            recent = self._recent[str(source_id)]
+            recent.append((now, count))
+            while recent and recent[0][0] < now - self.RATE_WINDOW:
+                recent.popleft()
+
+    def _rates(self) -> Dict[str, float]:
+        now = time.monotonic()
+        window = min(self.RATE_WINDOW, max(1.0, time.time() - self.started))
+        return {
+            source: sum(count for stamp, count in recent if stamp >= now - window) / window
+            for source, recent in self._recent.items()
+        }
+
+    def rates(self) -> Dict[str, float]:
+        with self._lock:
+            return self._rates()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = {
+                name: {_format_labels(key): value for key, value in series.items()}
+                for name, series in self.counters.items()
+            }
+            gauges = {
+                name: {_format_labels(key): value for key, value in series.items()}
+                for name, series in self.gauges.items()
+            }
+            histograms = {
+                name: {
+                    _format_labels(key): {
+                        "count": histogram.count,
+                        "sum": histogram.total,
+                        "p50": histogram.quantile(0.5),
+                        "p95": histogram.quantile(0.95),
+                        "p99": histogram.quantile(0.99),
+                    }
+                    for key, histogram in series.items()
+                }
+                for name, series in self.histograms.items()
+            }
+            rates = self._rates()
+        return {
+            "uptime_seconds": time.time() - self.started,
+            "messages_per_second": rates,
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": histograms,
+        }
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self.gauges.items()):
+                lines.append(f"# TYPE {name} gauge")
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                        cumulative += bucket_count
+                        labels = _format_labels(key, {"le": str(bound)})
+                        lines.append(f"{name}_bucket{labels} {cumulative}")
+                    labels = _format_labels(key, {"le": "+Inf"})
+                    lines.append(f"{name}_bucket{labels} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.total}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+            rates = self._rates()
+        lines.append("# TYPE cloner_messages_per_second gauge")
+        for source, rate in sorted(rates.items()):
+            lines.append(f'cloner_messages_per_second{{source="{source}"}} {rate}')
+        return "\n".join(lines) + "\n"
+
+    def _counter_total(self, name: str) -> float:
+        return sum(self.counters.get(name, {}).values())
+
+    def summary(self) -> str:
+        with self._lock:
+            forwarded = self._counter_total("cloner_messages_forwarded_total")
+            flood = self._counter_total("cloner_flood_wait_seconds_total")
+            errors = self._counter_total("cloner_errors_total")
+            latency = Histogram()
+            for histogram in self.histograms.get("cloner_forward_latency_seconds", {}).values():
+                latency.counts = [a + b for a, b in zip(latency.counts, histogram.counts)]
+                latency.count += histogram.count
+            queue_depth = sum(self.gauges.get("cloner_live_queue_depth", {}).values())
+            rate = sum(self._rates().values())
+        return (
+            f"Скорость: {rate:.1f} сообщ./с | Переслано: {int(forwarded)} | "
+            f"Задержка p50/p95: {latency.quantile(0.5):g}/{latency.quantile(0.95):g} с | "
+            f"FloodWait: {int(flood)} с | Ошибки: {int(errors)} | Очередь: {int(queue_depth)}"
+        )
+
+
+class MetricsExporter:
+    def __init__(
+        self,
+        metrics: Metrics,
+        port: Optional[int] = None,
+        json_path: Optional[str] = None,
+        interval: float = 10.0,
+        host: str = "127.0.0.1",
+    ):
+        self.metrics = metrics
+        self.port = port
+        self.json_path = json_path
+        self.interval = interval
+        self.host = host
+        self._server = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = self.metrics.render_prometheus().encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/plain; version=0.0.4\r\n"
+                + f"Content-Length: {len(body)}\r\n".encode()
+                + b"Connection: close\r\n\r\n"
+                + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _write_snapshot(self):
+        temp_path = f"{self.json_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.metrics.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.json_path)
+
+    async def _snapshot_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.interval)
+            await loop.run_in_executor(None, self._write_snapshot)
+
+    async def start(self):
+        if self.port:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        if self.json_path:
+            self._task = asyncio.create_task(self._snapshot_loop())
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            await asyncio.get_running_loop().run_in_executor(None, self._write_snapshot)
@@ -0,0 +1,114 @@
+import datetime
+from typing import Dict, List, Optional
+
+from metrics import Metrics
+
+
+def format_eta(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "—"
+    return str(datetime.timedelta(seconds=int(seconds)))
+
+
+class SourcePlan:
+    def __init__(self, source_id: int, total: int, top_id: int, start_after_id: int):
+        self.source_id = source_id
+        self.total = total
+        self.top_id = top_id
+        self.start_after_id = start_after_id
+        self.done_id = start_after_id
+
+    @property
+    def remaining(self) -> int:
+        if self.done_id <= 0:
+            return self.total
+        return max(0, min(self.total, self.top_id - self.done_id))
+
+    @property
+    def planned(self) -> int:
+        if self.start_after_id <= 0:
+            return self.total
+        return max(0, min(self.total, self.top_id - self.start_after_id))
+
+
+class MigrationPlanner:
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+        self.plans: Dict[str, SourcePlan] = {}
+
+    async def plan_source(
+        self,
+        client,
+        source_id: int,
+        last_id: int = 0,
+        start_date: Optional[datetime.datetime] = None,
+        peer=None,
+    ) -> SourcePlan:
+        peer = peer or source_id
+        head = await client.get_messages(peer, limit=1)
+        top_id = head[0].id if head else 0
+        start_after_id = last_id
+        if start_date:
+            before = await client.get_messages(peer, limit=1, offset_date=start_date)
+            start_after_id = before[0].id if before else 0
+        plan = SourcePlan(source_id, getattr(head, "total", len(head)), top_id, start_after_id)
+        self.plans[str(source_id)] = plan
+        self._publish(plan)
+        return plan
+
+    def advance(self, source_id: str, message_id: int):
+        plan = self.plans.get(str(source_id))
+        if plan is None:
+            return
+        if message_id > plan.top_id:
+            plan.total += message_id - plan.top_id
+            plan.top_id = message_id
+        plan.done_id = max(plan.done_id, message_id)
+        self._publish(plan)
+
+    def _publish(self, plan: SourcePlan):
+        self.metrics.set_gauge("cloner_backlog_messages", plan.remaining, source=plan.source_id)
+
+    def eta(self, source_id: str) -> Optional[float]:
+        plan = self.plans.get(str(source_id))
+        if plan is None:
+            return None
+        if not plan.remaining:
+            return 0.0
+        rate = self.metrics.rates().get(str(source_id), 0.0)
+        return plan.remaining / rate if rate else None
+
+    @property
+    def remaining(self) -> int:
+        return sum(plan.remaining for plan in self.plans.values())
+
+    def overall_eta(self) -> Optional[float]:
+        if not self.remaining:
+            return 0.0
+        rate = sum(self.metrics.rates().values())
+        return self.remaining / rate if rate else None
+
+    def describe(self) -> List[str]:
+        lines = []
+        for key, plan in self.plans.items():
+            lines.append(
+                f"Источник {plan.source_id}: всего {plan.total}, к копированию ~{plan.planned}, "
+                f"осталось ~{plan.remaining}, ETA {format_eta(self.eta(key))}"
+            )
+        lines.append(
+            f"Итого осталось ~{self.remaining} сообщений, ETA {format_eta(self.overall_eta())}"
+        )
+        return lines
+
+    @property
+    def percent(self) -> float:
+        planned = sum(plan.planned for plan in self.plans.values())
+        if not planned:
+            return 100.0
+        return max(0.0, 100.0 * (planned - self.remaining) / planned)
+
+    def summary(self) -> str:
+        return (
+            f"Готово: {self.percent:.1f}% | Осталось: ~{self.remaining} | "
+            f"ETA: {format_eta(self.overall_eta())}"
+        )
@@ -0,0 +1,98 @@
+import asyncio
+import time
+from typing import Dict, Tuple
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float, ceiling: float):
+        self.rate = rate
+        self.ceiling = ceiling
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.clean_streak = 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def consume(self):
+        self.tokens -= 1
+
+
+class AdaptiveRateLimiter:
+    def __init__(
+        self,
+        rate: float = 0.5,
+        burst: float = 3,
+        min_rate: float = 0.02,
+        max_rate: float = 5.0,
+        increase_step: float = 0.05,
+        decrease_factor: float = 0.5,
+        recovery_after: int = 20,
+        sleep=asyncio.sleep,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.recovery_after = recovery_after
+        self.sleep = sleep
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._locks: Dict[Tuple[str, ...], asyncio.Lock] = {}
+
+    def bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst, self.max_rate)
+            self._buckets[key] = bucket
+        return bucket
+
+    def delay(self, *keys: str) -> float:
+        now = time.monotonic()
+        return max((self.bucket(key).delay(now) for key in keys), default=0.0)
+
+    async def acquire(self, *keys: str):
+        lock = self._locks.setdefault(keys, asyncio.Lock())
+        async with lock:
+            while True:
+                wait = self.delay(*keys)
+                if wait <= 0:
+                    for key in keys:
+                        self.bucket(key).consume()
+                    return
+                await self.sleep(wait)
+
+    def on_success(self, *keys: str):
+        for key in keys:
+            bucket = self.bucket(key)
+            bucket.clean_streak += 1
+            if bucket.clean_streak >= self.recovery_after:
+                bucket.clean_streak = 0
+                if bucket.rate < bucket.ceiling:
+                    bucket.rate = min(bucket.ceiling, bucket.rate + self.increase_step)
+                else:
+                    bucket.ceiling = min(self.max_rate, bucket.ceiling + self.increase_step / 2)
+
+    def on_flood_wait(self, seconds: float, *keys: str):
+        now = time.monotonic()
+        for key in keys:
+            bucket = self.bucket(key)
+            bucket.blocked_until = max(bucket.blocked_until, now + seconds)
+            bucket.ceiling = max(self.min_rate, bucket.rate * 0.9)
+            bucket.rate = max(self.min_rate, bucket.rate * self.decrease_factor)
+            bucket.tokens = 0
+            bucket.clean_streak = 0
+
+    def current_rate(self, *keys: str) -> float:
+        return min((self.bucket(key).rate for key in keys), default=self.rate)
@@ -0,0 +1,77 @@
+from typing import List, Tuple
+
+from rate_limiter import AdaptiveRateLimiter
+
+
+class PoolMember:
+    def __init__(self, name: str, client):
+        self.name = name
+        self.client = client
+        self.sent_requests = 0
+        self.flood_waits = 0
+        self.peers = {}
+
+
+class SessionPool:
+    REPICK_INTERVAL = 1.0
+
+    def __init__(self, rate_limiter: AdaptiveRateLimiter):
+        self.rate_limiter = rate_limiter
+        self.members: List[PoolMember] = []
+
+    def add(self, name: str, client) -> PoolMember:
+        member = PoolMember(name, client)
+        self.members.append(member)
+        return member
+
+    def remove(self, member: PoolMember):
+        self.members.remove(member)
+
+    @property
+    def primary(self) -> PoolMember:
+        return self.members[0]
+
+    @staticmethod
+    def account_key(member: PoolMember) -> str:
+        return f"account:{member.name}"
+
+    @staticmethod
+    def target_key(member: PoolMember, target_id: int) -> str:
+        return f"target:{member.name}:{target_id}"
+
+    def keys(self, member: PoolMember, target_id: int) -> Tuple[str, str]:
+        return self.account_key(member), self.target_key(member, target_id)
+
+    def pick(self, target_id: int) -> PoolMember:
+        return min(
+            self.members,
+            key=lambda member: (
+                self.rate_limiter.delay(*self.keys(member, target_id)),
+                member.sent_requests,
+            ),
+        )
+
+    async def acquire(self, target_id: int) -> PoolMember:
+        while True:
+            member = self.pick(target_id)
+            keys = self.keys(member, target_id)
+            wait = self.rate_limiter.delay(*keys)
+            if wait <= self.REPICK_INTERVAL:
+                await self.rate_limiter.acquire(*keys)
+                member.sent_requests += 1
+                return member
+            await self.rate_limiter.sleep(self.REPICK_INTERVAL)
+
+    def on_success(self, member: PoolMember, target_id: int):
+        self.rate_limiter.on_success(*self.keys(member, target_id))
+
+    def on_flood_wait(self, member: PoolMember, target_id: int, seconds: float):
+        member.flood_waits += 1
+        self.rate_limiter.on_flood_wait(seconds, self.target_key(member, target_id))
+
+    def on_account_flood(self, member: PoolMember, seconds: float):
+        member.flood_waits += 1
+        self.rate_limiter.on_flood_wait(seconds, self.account_key(member))
+
+    def current_rate(self, member: PoolMember, target_id: int) -> float:
+        return self.rate_limiter.current_rate(*self.keys(member, target_id))
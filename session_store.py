@@ -0,0 +1,128 @@
+import asyncio
+import os
+import sqlite3
+import time
+from typing import Optional
+
+from telethon.sessions import MemorySession, SQLiteSession
+
+
+class BufferedSession(MemorySession):
+    def __init__(self, name: str, flush_interval: float = 30.0):
+        super().__init__()
+        self.path = name if name.endswith(".session") else f"{name}.session"
+        self.flush_interval = flush_interval
+        self._dirty = False
+        self._new_entities = set()
+        self._task: Optional[asyncio.Task] = None
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        stored = SQLiteSession(self.path)
+        try:
+            MemorySession.set_dc(self, stored.dc_id, stored.server_address, stored.port)
+            self._auth_key = stored.auth_key
+            self._takeout_id = stored.takeout_id
+            self._update_states = dict(stored.get_update_states())
+        finally:
+            stored.close()
+        conn = sqlite3.connect(self.path)
+        try:
+            self._entities = set(
+                conn.execute("SELECT id, hash, username, phone, name FROM entities").fetchall()
+            )
+        finally:
+            conn.close()
+
+    def set_dc(self, dc_id, server_address, port):
+        super().set_dc(dc_id, server_address, port)
+        self._dirty = True
+
+    @MemorySession.auth_key.setter
+    def auth_key(self, value):
+        self._auth_key = value
+        self._dirty = True
+
+    @MemorySession.takeout_id.setter
+    def takeout_id(self, value):
+        self._takeout_id = value
+        self._dirty = True
+
+    def set_update_state(self, entity_id, state):
+        super().set_update_state(entity_id, state)
+        self._dirty = True
+
+    def process_entities(self, tlo):
+        rows = set(self._entities_to_rows(tlo) or ())
+        new_rows = rows - self._entities
+        if new_rows:
+            self._entities |= new_rows
+            self._new_entities |= new_rows
+            self._dirty = True
+
+    def _take_snapshot(self):
+        snapshot = (
+            self._dc_id,
+            self._server_address,
+            self._port,
+            self._auth_key,
+            self._takeout_id,
+            list(self._update_states.items()),
+            list(self._new_entities),
+        )
+        self._new_entities = set()
+        self._dirty = False
+        return snapshot
+
+    def _write(self, snapshot):
+        dc_id, server_address, port, auth_key, takeout_id, states, entities = snapshot
+        stored = SQLiteSession(self.path)
+        try:
+            if dc_id:
+                stored.set_dc(dc_id, server_address, port)
+            stored.auth_key = auth_key
+            stored.takeout_id = takeout_id
+            for entity_id, state in states:
+                stored.set_update_state(entity_id, state)
+            stored.save()
+        finally:
+            stored.close()
+        if not entities:
+            return
+        now = int(time.time())
+        conn = sqlite3.connect(self.path)
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO entities (id, hash, username, phone, name, date) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(*row, now) for row in entities],
+                )
+        finally:
+            conn.close()
+
+    def flush(self):
+        if self._dirty:
+            self._write(self._take_snapshot())
+
+    async def flush_async(self):
+        if self._dirty:
+            snapshot = self._take_snapshot()
+            await asyncio.get_running_loop().run_in_executor(None, self._write, snapshot)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush_async()
+
+    async def start(self):
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush_async()
@@ -1,20 +1,51 @@
 import asyncio
+import contextlib
 import datetime
 import json
+import logging
 import os
-from typing import Dict, List
+import time
+from typing import Dict, List, Union
 
 from telethon import TelegramClient, events
 from telethon.errors.rpcerrorlist import (
+    ChatForwardsRestrictedError,
     FloodWaitError,
+    PeerFloodError,
     PhoneCodeInvalidError,
     SessionPasswordNeededError,
+    TakeoutInitDelayError,
+    TakeoutInvalidError,
+    TakeoutRequiredError,
 )
 from telethon.tl.types import MessageService
 
+from checkpoint_store import CheckpointStore
+from copy_engine import CopyEngine
+from filters import FilteredOut, MessageFilter
+from live_pipeline import LivePipeline
+from log_pipeline import APP_LOGGER, MESSAGE_LOGGER
+from message_index import MessageIndex
+from metrics import Metrics, MetricsExporter
+from planner import MigrationPlanner
+from rate_limiter import AdaptiveRateLimiter
+from session_pool import SessionPool
+from session_store import BufferedSession
+
+logger = logging.getLogger(f"{APP_LOGGER}.engine")
+message_log = logging.getLogger(MESSAGE_LOGGER)
+
 
 class TelegramLogic:
     PROGRESS_FILE = "progress.json"
+    STATE_FILE = "cloner_state.db"
+    MAX_FORWARD_BATCH = 100
+    TAKEOUT_HISTORY_RATE = 2.0
+    CATCH_UP_INTERVAL = 60.0
+    CONNECTION_CHECK_INTERVAL = 5.0
+    SHUTDOWN_TIMEOUT = 10.0
+    LAGGING_TARGET_TIMEOUT = 5.0
+    PEER_FLOOD_PENALTY = 300.0
 
     def __init__(
         self,
@@ -23,36 +54,128 @@ class TelegramLogic:
         log_callback=None,
         auth_callback=None,
         start_date: datetime.datetime = None,
+        session_names: List[str] = None,
+        batch_size: int = MAX_FORWARD_BATCH,
+        rate_limit: float = 0.5,
+        parallelism: int = 3,
+        live_workers: int = 4,
+        live_queue_size: int = 1000,
+        page_size: int = 100,
+        read_ahead: int = 3,
+        use_takeout: bool = False,
+        metrics_port: int = None,
+        metrics_file: str = None,
+        message_filter: MessageFilter = None,
+        media_cache_dir: str = "media_cache",
+        media_cache_mb: int = 2048,
+        memory_session: bool = False,
     ):
         self.api_id = int(api_id)
         self.api_hash = api_hash
         self.log_callback = log_callback
         self.auth_callback = auth_callback
         self.start_date = start_date
+        self.batch_size = max(1, min(int(batch_size), self.MAX_FORWARD_BATCH))
         self.session_name = "cloner_session"
-        self.progress: Dict[str, int] = self._load_progress()
+        self.session_names = list(session_names or [self.session_name])
+        self.checkpoints = CheckpointStore(self.STATE_FILE)
+        self._import_legacy_progress()
+        self.progress: Dict[str, int] = self.checkpoints.load()
+        self.message_index = MessageIndex(self.STATE_FILE)
         self.is_running = False
+        self._as_copy_supported = True
+        self.rate_limiter = AdaptiveRateLimiter(rate=rate_limit)
+        self.session_pool = SessionPool(self.rate_limiter)
+        self.metrics = Metrics()
+        self.planner = MigrationPlanner(self.metrics)
+        self.metrics_exporter = MetricsExporter(
+            self.metrics, port=metrics_port, json_path=metrics_file
+        )
+        self.parallelism = max(1, int(parallelism))
+        self.live_workers = max(1, int(live_workers))
+        self.live_queue_size = max(1, int(live_queue_size))
+        self.page_size = max(1, min(int(page_size), self.MAX_FORWARD_BATCH))
+        self.read_ahead = max(1, int(read_ahead))
+        self.use_takeout = use_takeout
+        self.message_filter = message_filter
+        self.copy_engine = CopyEngine(cache_dir=media_cache_dir, cache_size_mb=media_cache_mb)
+        self.memory_session = memory_session
+        self._sessions: List[BufferedSession] = []
+        self._history_client = None
+        self.target_ids: List[int] = []
+        self._live_sources = set()
+        self._catching_up: Dict[int, list] = {}
+        self._scanned_ids: Dict[int, int] = {}
+        self._unverified_sources = set()
+        self._history_floors: Dict[int, int] = {}
+        self.live_pipelines: Dict[int, LivePipeline] = {}
+        self._loop = None
+        self._stop_event = None
+        self._stop_requested_at = None
+        self._in_flight = set()
 
-    def log(self, message: str):
+    def log(self, message: str, level: int = logging.INFO, **fields):
+        logger.log(level, message, extra=fields)
         if self.log_callback:
             self.log_callback(message)
 
-    def _load_progress(self) -> Dict[str, int]:
-        if not os.path.exists(self.PROGRESS_FILE):
-            return {}
+    @staticmethod
+    def _log_delivery(
+        messages, source_id: int, target_id: int, started: float, outcome: str, error=None
+    ):
+        if not message_log.isEnabledFor(logging.INFO):
+            return
+        message_log.info(
+            "Доставка %s -> %s: %s",
+            source_id,
+            target_id,
+            outcome,
+            extra={
+                "event": "delivery",
+                "source": source_id,
+                "target": target_id,
+                "message_id": messages[0].id,
+                "count": len(messages),
+                "latency": round(time.monotonic() - started, 4),
+                "outcome": outcome,
+                "error": error,
+            },
+        )
+
+    def _import_legacy_progress(self):
+        if not os.path.exists(self.PROGRESS_FILE) or not self.checkpoints.is_empty():
+            return
         try:
             with open(self.PROGRESS_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return {}
+                imported = self.checkpoints.import_progress(json.load(f))
+            self.log(f"Импортирован прогресс из {self.PROGRESS_FILE}: {imported} источников.")
+        except Exception as exc:
+            self.log(f"Не удалось импортировать {self.PROGRESS_FILE}: {exc}")
+
+    @staticmethod
+    def _progress_key(source_id: int, target_id: int) -> str:
+        return f"{source_id}:{target_id}"
 
-    def _save_progress(self):
-        with open(self.PROGRESS_FILE, "w", encoding="utf-8") as f:
-            json.dump(self.progress, f, ensure_ascii=False, indent=2)
+    def _last_id(self, source_id: int, target_id: int) -> int:
+        key = self._progress_key(source_id, target_id)
+        if key in self.progress:
+            return self.progress[key]
+        return self.progress.get(str(source_id), 0)
 
-    def _update_progress(self, source_id: str, message_id: int):
-        self.progress[source_id] = message_id
-        self._save_progress()
+    def _update_progress(self, source_id: int, target_id: int, message_id: int):
+        key = self._progress_key(source_id, target_id)
+        self.progress[key] = message_id
+        self.checkpoints.set(key, message_id)
+        self.metrics.set_gauge(
+            "cloner_source_last_id", message_id, source=source_id, target=target_id
+        )
+        targets = self.target_ids or [target_id]
+        self.planner.advance(
+            source_id, min(self._last_id(source_id, target) for target in targets)
+        )
+
+    def status(self) -> str:
+        return f"{self.metrics.summary()} | {self.planner.summary()}"
 
     async def _authorize(self, client: TelegramClient):
         if await client.is_user_authorized():
@@ -80,124 +203,876 @@ class TelegramLogic:
             raise Exception(f"Неверный код: {exc}")
         self.log("Авторизация успешна!")
 
-    async def _forward_message(self, client, message, target_id):
+    def _accepts(self, message, source_id: int) -> bool:
+        if self.message_filter is None or self.message_filter.accepts(message):
+            return True
+        self.metrics.inc("cloner_messages_filtered_total", source=source_id)
+        return False
+
+    async def _forward_messages(self, client, messages, target_id, from_peer):
         kwargs = {}
-        try:
+        if self._as_copy_supported:
             kwargs["as_copy"] = True
-            await client.forward_messages(
+        try:
+            return await client.forward_messages(
                 entity=target_id,
-                messages=message,
-                from_peer=message.chat_id,
+                messages=messages,
+                from_peer=from_peer,
                 **kwargs,
             )
         except TypeError:
+            if not kwargs:
+                raise
+            self._as_copy_supported = False
             self.log("as_copy не поддерживается вашей версией Telethon, пересылаем стандартно.")
-            await client.forward_messages(
+            return await client.forward_messages(
                 entity=target_id,
-                messages=message,
-                from_peer=message.chat_id,
+                messages=messages,
+                from_peer=from_peer,
+            )
+
+    def _peer(self, peer_id: int, member=None):
+        member = member or self.session_pool.primary
+        return member.peers.get(peer_id, peer_id)
+
+    async def _shielded(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+        return await asyncio.shield(task)
+
+    async def _drain_in_flight(self):
+        if not self._in_flight:
+            return
+        self.log(f"Ожидаем завершения отправок: {len(self._in_flight)}.")
+        done, pending = await asyncio.wait(set(self._in_flight), timeout=self.SHUTDOWN_TIMEOUT)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*done, *pending, return_exceptions=True)
+        if pending:
+            self.log(f"Прервано незавершенных отправок: {len(pending)}.")
+
+    async def _deliver(self, member, messages, target_id: int, source_id: int, files):
+        if files is None:
+            result = await self._forward_messages(
+                member.client,
+                messages,
+                self._peer(target_id, member),
+                self._peer(source_id, member),
             )
+        else:
+            result = await self.copy_engine.send(
+                member.client, messages, files, self._peer(target_id, member), member.name
+            )
+        await self.message_index.record(
+            source_id,
+            [message.id for message in messages],
+            [sent.id if sent else None for sent in result],
+            target_id,
+        )
+        return result
+
+    async def _send(self, messages, target_id: int, source_id: int, files=None):
+        while self.is_running:
+            member = await self.session_pool.acquire(target_id)
+            if not self.is_running:
+                break
+            started = time.monotonic()
+            try:
+                result = await self._shielded(
+                    self._deliver(member, messages, target_id, source_id, files)
+                )
+            except FloodWaitError as flood_exc:
+                self.metrics.inc("cloner_forward_requests_total", outcome="flood")
+                self.metrics.inc(
+                    "cloner_flood_wait_seconds_total", flood_exc.seconds, kind="forward"
+                )
+                self.session_pool.on_flood_wait(member, target_id, flood_exc.seconds)
+                self._log_delivery(messages, source_id, target_id, started, "flood")
+                self.log(
+                    f"FloodWait аккаунта {member.name}: ждем {flood_exc.seconds} сек., "
+                    f"темп снижен до {self.session_pool.current_rate(member, target_id):.2f} "
+                    "запр./сек."
+                )
+                continue
+            except PeerFloodError:
+                self.metrics.inc("cloner_forward_requests_total", outcome="peer_flood")
+                self.session_pool.on_account_flood(member, self.PEER_FLOOD_PENALTY)
+                self._log_delivery(messages, source_id, target_id, started, "peer_flood")
+                self.log(
+                    f"Аккаунт {member.name} ограничен Telegram (PeerFlood), "
+                    f"пауза {self.PEER_FLOOD_PENALTY:.0f} сек. для всех получателей."
+                )
+                continue
+            except Exception as exc:
+                self.metrics.inc("cloner_forward_requests_total", outcome="error")
+                self._log_delivery(messages, source_id, target_id, started, "error", repr(exc))
+                raise
+            self._log_delivery(messages, source_id, target_id, started, "ok")
+            self.metrics.observe("cloner_forward_latency_seconds", time.monotonic() - started)
+            self.metrics.inc("cloner_forward_requests_total", outcome="ok")
+            self.session_pool.on_success(member, target_id)
+            return result
+        return None
 
-    async def _migrate_source(self, client, source_id: int, target_id: int):
-        source_key = str(source_id)
+    async def _forward_chunk(self, chunk, source_id: int, target_id: int):
+        fresh = [
+            message
+            for message in chunk
+            if not self.message_index.contains(source_id, message.id, target_id)
+        ]
+        if len(fresh) < len(chunk):
+            self.log(
+                f"Пропущено {len(chunk) - len(fresh)} уже скопированных сообщений "
+                f"источника {source_id}"
+            )
+        if not fresh:
+            return 0
+        chunk = fresh
+        if source_id in self.copy_engine.sources:
+            return await self._copy_chunk(chunk, source_id, target_id)
+        try:
+            result = await self._send(chunk, target_id, source_id)
+        except ChatForwardsRestrictedError:
+            self.copy_engine.sources.add(source_id)
+            self.log(
+                f"Источник {source_id} запрещает пересылку, "
+                "копируем через скачивание и повторную загрузку."
+            )
+            return await self._copy_chunk(chunk, source_id, target_id)
+        except Exception as exc:
+            if len(chunk) == 1:
+                self.metrics.inc("cloner_errors_total", kind="forward")
+                self.log(f"Ошибка при копировании сообщения {chunk[0].id}: {exc}")
+                return 0
+            self.log(
+                f"Ошибка при копировании пакета {chunk[0].id}-{chunk[-1].id}: {exc}. "
+                "Делим пакет и повторяем."
+            )
+            middle = self._album_start(chunk, len(chunk) // 2) or len(chunk) // 2
+            copied = await self._forward_chunk(chunk[:middle], source_id, target_id)
+            if not self.is_running:
+                return copied
+            return copied + await self._forward_chunk(chunk[middle:], source_id, target_id)
+        return self._count_sent(source_id, result)
+
+    def _count_sent(self, source_id: int, result) -> int:
+        if result is None:
+            return 0
+        copied = sum(1 for sent in result if sent is not None)
+        self.metrics.record_forwarded(source_id, copied)
+        return copied
+
+    def _album_units(self, chunk) -> List[list]:
+        units = []
+        for message in chunk:
+            if units and self._same_album(units[-1][-1], message) and len(units[-1]) < 10:
+                units[-1].append(message)
+            else:
+                units.append([message])
+        return units
+
+    async def _copy_chunk(self, chunk, source_id: int, target_id: int):
+        client = self.session_pool.primary.client
+        units = self._album_units(chunk)
+        downloads = [None] * len(units)
+        copied = 0
+        index = 0
+        try:
+            while index < len(units) and self.is_running:
+                for ahead in range(index, min(len(units), index + self.read_ahead)):
+                    if downloads[ahead] is None:
+                        downloads[ahead] = asyncio.ensure_future(
+                            self.copy_engine.prepare(client, units[ahead])
+                        )
+                unit, download = units[index], downloads[index]
+                index += 1
+                try:
+                    files = await download
+                except Exception as exc:
+                    self.metrics.inc("cloner_errors_total", kind="copy")
+                    self.log(f"Ошибка скачивания медиа {unit[0].id}-{unit[-1].id}: {exc}")
+                    continue
+                try:
+                    result = await self._send(unit, target_id, source_id, files=files)
+                except Exception as exc:
+                    self.metrics.inc("cloner_errors_total", kind="copy")
+                    self.log(f"Ошибка копирования сообщений {unit[0].id}-{unit[-1].id}: {exc}")
+                    continue
+                finally:
+                    self.copy_engine.release(unit, files)
+                copied += self._count_sent(source_id, result)
+        finally:
+            for unit, download in zip(units[index:], downloads[index:]):
+                if download is None:
+                    continue
+                if download.done() and not download.cancelled() and not download.exception():
+                    self.copy_engine.release(unit, download.result())
+                else:
+                    download.cancel()
+            await asyncio.gather(*(d for d in downloads if d is not None), return_exceptions=True)
+        return copied
+
+    @staticmethod
+    def _same_album(previous, message) -> bool:
+        return message.grouped_id is not None and message.grouped_id == previous.grouped_id
+
+    def _album_start(self, chunk, index: int) -> int:
+        while index > 0 and self._same_album(chunk[index - 1], chunk[index]):
+            index -= 1
+        return index
+
+    async def _checkpoint_interrupted(self, chunk, source_id: int, target_id: int, last_id: int):
+        if self._in_flight:
+            await asyncio.wait(set(self._in_flight), timeout=self.SHUTDOWN_TIMEOUT)
+        if all(self.message_index.contains(source_id, message.id, target_id) for message in chunk):
+            self._update_progress(source_id, target_id, last_id)
+
+    async def _flush_chunk(self, chunk, source_id: int, target_id: int, last_id: int):
+        if chunk:
+            try:
+                copied = await self._forward_chunk(chunk, source_id, target_id)
+            except asyncio.CancelledError:
+                await self._checkpoint_interrupted(chunk, source_id, target_id, last_id)
+                raise
+            if not self.is_running:
+                return
+            self.log(
+                f"Скопировано {copied} из {len(chunk)} сообщений "
+                f"({chunk[0].id}-{chunk[-1].id}) источника {source_id}"
+            )
+        if last_id:
+            self._update_progress(source_id, target_id, last_id)
+
+    async def _migrate_source(self, client, source_id: int, target_ids: List[int]) -> List[int]:
         self.log(f"Начинаем миграцию из источника {source_id}")
         iterator_kwargs = {"reverse": True}
+        after_ids = {target_id: 0 for target_id in target_ids}
 
-        if self.start_date:
+        plan = self.planner.plans.get(str(source_id))
+        if self.start_date and plan is not None:
+            after_ids = {
+                target_id: max(plan.start_after_id, self._last_id(source_id, target_id))
+                for target_id in target_ids
+            }
+            last_id = min(after_ids.values())
+            iterator_kwargs["offset_id"] = last_id
+            self.log(
+                f"Копируем с даты {self.start_date.strftime('%d.%m.%Y')}, "
+                f"продолжаем с сообщения после ID {last_id}"
+            )
+        elif self.start_date:
             iterator_kwargs["offset_date"] = self.start_date
             self.log(f"Копируем с даты {self.start_date.strftime('%d.%m.%Y')}")
         else:
-            last_id = self.progress.get(source_key, 0)
+            after_ids = {target_id: self._last_id(source_id, target_id) for target_id in target_ids}
+            last_id = min(after_ids.values())
             iterator_kwargs["offset_id"] = last_id
             self.log(f"Продолжаем с сообщения после ID {last_id}")
+            if not last_id and self.message_filter and self.message_filter.min_date:
+                iterator_kwargs["offset_date"] = self.message_filter.min_date
+        if self.message_filter:
+            iterator_kwargs.update(self.message_filter.server_kwargs())
 
-        async for message in client.iter_messages(source_id, **iterator_kwargs):
-            if not self.is_running:
+        stats = {"fetch": 0.0, "forward": 0.0}
+        buffers = {target_id: asyncio.Queue(self.read_ahead) for target_id in target_ids}
+        completed = []
+
+        async def forward(target_id: int):
+            buffer = buffers[target_id]
+            try:
+                caught_up = await self._forward_history(
+                    source_id, target_id, buffer, stats, after_ids[target_id], buffers
+                )
+                if not caught_up and self.is_running:
+                    await self._resume_history(
+                        client, source_id, target_id, iterator_kwargs, stats, after_ids[target_id]
+                    )
+                completed.append(target_id)
+            except Exception as exc:
+                self.log(f"Ошибка миграции источника {source_id} в {target_id}: {exc}")
+            finally:
+                buffers.pop(target_id, None)
+                while not buffer.empty():
+                    buffer.get_nowait()
+
+        producer = asyncio.create_task(
+            self._fetch_history(client, source_id, iterator_kwargs, buffers, stats)
+        )
+        try:
+            await asyncio.gather(*(forward(target_id) for target_id in target_ids))
+        finally:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+            self.log(
+                f"Источник {source_id}: загрузка истории {stats['fetch']:.1f} с, "
+                f"пересылка {stats['forward']:.1f} с"
+            )
+        return completed
+
+    async def _resume_history(
+        self, client, source_id: int, target_id: int, iterator_kwargs, stats, after_id: int
+    ):
+        after_id = max(after_id, self._last_id(source_id, target_id))
+        self.log(
+            f"Получатель {target_id} отстает от общего чтения источника {source_id}, "
+            f"дочитываем для него отдельно после ID {after_id}."
+        )
+        kwargs = dict(iterator_kwargs)
+        if after_id:
+            kwargs.pop("offset_date", None)
+            kwargs["offset_id"] = after_id
+        buffers = {target_id: asyncio.Queue(self.read_ahead)}
+        producer = asyncio.create_task(
+            self._fetch_history(client, source_id, kwargs, buffers, stats)
+        )
+        try:
+            await self._forward_history(source_id, target_id, buffers[target_id], stats, after_id)
+        finally:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
+    async def _publish_page(self, buffers: Dict[int, asyncio.Queue], item):
+        puts = {
+            target_id: asyncio.ensure_future(buffer.put(item))
+            for target_id, buffer in list(buffers.items())
+        }
+        pending = set(puts.values())
+        try:
+            while pending:
+                _, pending = await asyncio.wait(pending, timeout=self.LAGGING_TARGET_TIMEOUT)
+                if pending and len(pending) < len(puts):
+                    break
+        finally:
+            for target_id, put in puts.items():
+                if not put.done():
+                    put.cancel()
+                    buffers.pop(target_id, None)
+
+    async def _fetch_history(self, client, source_id: int, iterator_kwargs, buffers, stats):
+        kwargs = dict(iterator_kwargs)
+        try:
+            while self.is_running:
+                reader = self._history_client or client
+                limiter_key = "history" if reader is client else "takeout"
+                await self.rate_limiter.acquire(limiter_key)
+                started = time.monotonic()
+                try:
+                    page = await reader.get_messages(
+                        self._peer(source_id), limit=self.page_size, **kwargs
+                    )
+                except FloodWaitError as flood_exc:
+                    self.metrics.inc(
+                        "cloner_flood_wait_seconds_total", flood_exc.seconds, kind="history"
+                    )
+                    self.rate_limiter.on_flood_wait(flood_exc.seconds, limiter_key)
+                    self.log(f"FloodWait при чтении истории {source_id}: {flood_exc.seconds} сек.")
+                    continue
+                except (TakeoutInvalidError, TakeoutRequiredError) as exc:
+                    if reader is client:
+                        raise
+                    self._history_client = None
+                    self.log(f"Takeout-сессия недоступна ({exc}), читаем историю обычной сессией.")
+                    continue
+                finally:
+                    stats["fetch"] += time.monotonic() - started
+                self.metrics.observe("cloner_history_page_seconds", time.monotonic() - started)
+                self.metrics.inc("cloner_history_pages_total", source=source_id)
+                self.rate_limiter.on_success(limiter_key)
+                if not page:
+                    break
+                accepted = [
+                    message
+                    for message in page
+                    if not isinstance(message, MessageService) and self._accepts(message, source_id)
+                ]
+                await self._publish_page(buffers, (accepted, page[-1].id))
+                if self.message_filter and self.message_filter.past_max_date(page[-1]):
+                    break
+                kwargs.pop("offset_date", None)
+                kwargs["offset_id"] = page[-1].id
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            await self._publish_page(buffers, exc)
+            return
+        await self._publish_page(buffers, None)
+
+    async def _open_takeout(self, client, stack: contextlib.AsyncExitStack):
+        try:
+            if client.session.takeout_id is not None:
+                await client.end_takeout(success=False)
+            takeout = await stack.enter_async_context(
+                client.takeout(finalize=True, chats=True, megagroups=True, channels=True)
+            )
+        except TakeoutInitDelayError as exc:
+            self.log(
+                f"Telegram отложил takeout-сессию на {exc.seconds} сек. "
+                "Архив читается обычной сессией."
+            )
+            return None
+        except Exception as exc:
+            self.log(f"Не удалось открыть takeout-сессию: {exc}. Архив читается обычной сессией.")
+            return None
+        self.rate_limiter.bucket("takeout").rate = self.TAKEOUT_HISTORY_RATE
+        self.log("Takeout-сессия открыта, история читается с облегченными лимитами.")
+        return takeout
+
+    async def _forward_history(
+        self, source_id: int, target_id: int, buffer, stats, after_id: int = 0, attached=None
+    ) -> bool:
+        chunk = []
+        last_seen_id = 0
+        caught_up = True
+        while self.is_running:
+            if attached is not None and buffer.empty() and attached.get(target_id) is not buffer:
+                caught_up = False
+                break
+            page = await buffer.get()
+            if page is None:
                 break
+            if isinstance(page, Exception):
+                raise page
+            messages, page_last_id = page
+            started = time.monotonic()
+            for message in messages:
+                if not self.is_running:
+                    break
+                if message.id <= after_id:
+                    continue
+                if len(chunk) >= self.batch_size and not self._same_album(chunk[-1], message):
+                    last_id = max(last_seen_id, chunk[-1].id)
+                    await self._flush_chunk(chunk, source_id, target_id, last_id)
+                    chunk = []
+                elif len(chunk) >= self.MAX_FORWARD_BATCH:
+                    split = self._album_start(chunk, len(chunk) - 1) or len(chunk)
+                    head, chunk = chunk[:split], chunk[split:]
+                    await self._flush_chunk(head, source_id, target_id, head[-1].id)
+                if not self.is_running:
+                    break
+                chunk.append(message)
+            else:
+                if page_last_id > after_id:
+                    last_seen_id = page_last_id
+            stats["forward"] += time.monotonic() - started
+
+        if self.is_running:
+            started = time.monotonic()
+            await self._flush_chunk(chunk, source_id, target_id, last_seen_id)
+            stats["forward"] += time.monotonic() - started
+        return caught_up
 
-            if isinstance(message, MessageService):
-                self._update_progress(source_key, message.id)
+    async def _enqueue_live(self, messages):
+        if not self.is_running:
+            return
+        messages = [message for message in messages if not isinstance(message, MessageService)]
+        if not messages:
+            return
+        first = messages[0]
+        chat_id = first.chat_id if first.chat_id else getattr(first.peer_id, "channel_id", None)
+        if chat_id in self._catching_up:
+            self._catching_up[chat_id].extend(messages)
+            return
+        await self._dispatch_live(chat_id, messages)
+
+    async def _dispatch_live(self, source_id: int, messages, after_ids: Dict[int, int] = None):
+        targets = [
+            target_id
+            for target_id in self.live_pipelines
+            if (source_id, target_id) in self._live_sources
+        ]
+        if not targets:
+            return
+        if after_ids is None and source_id in self._scanned_ids:
+            if source_id not in self._unverified_sources:
+                self._scanned_ids[source_id] = max(
+                    self._scanned_ids[source_id], max(message.id for message in messages)
+                )
+        messages = [
+            message if self._accepts(message, source_id) else FilteredOut(message)
+            for message in messages
+        ]
+        for target_id in targets:
+            batch = messages
+            if after_ids is not None:
+                batch = [message for message in messages if message.id > after_ids[target_id]]
+            if not batch:
                 continue
+            pipeline = self.live_pipelines[target_id]
+            self.metrics.set_gauge("cloner_live_queue_depth", pipeline.depth, target=target_id)
+            if pipeline.depth >= pipeline.capacity:
+                self.log(
+                    f"Очередь новых постов для {target_id} заполнена ({pipeline.depth}), ожидаем."
+                )
+            await pipeline.put(source_id, batch)
+
+    async def _history_floor(self, client, source_id: int) -> int:
+        plan = self.planner.plans.get(str(source_id))
+        if self.start_date and plan is not None:
+            return plan.start_after_id
+        since = self.start_date or (self.message_filter and self.message_filter.min_date)
+        if not since:
+            return 0
+        if source_id not in self._history_floors:
+            await self.rate_limiter.acquire("history")
+            before = await client.get_messages(self._peer(source_id), limit=1, offset_date=since)
+            self._history_floors[source_id] = before[0].id if before else 0
+        return self._history_floors[source_id]
+
+    async def _catch_up(self, client, source_id: int):
+        targets = [
+            target_id
+            for target_id in self.live_pipelines
+            if (source_id, target_id) in self._live_sources
+        ]
+        if not targets or source_id in self._catching_up:
+            return
+        self._catching_up[source_id] = []
+        top_id = 0
+        completed = False
+        try:
+            floor = await self._history_floor(client, source_id)
+            scanned_id = self._scanned_ids.get(source_id)
+            after_ids = {
+                target_id: max(
+                    floor, self._last_id(source_id, target_id) if scanned_id is None else scanned_id
+                )
+                for target_id in targets
+            }
+            await self.rate_limiter.acquire("history")
+            head = await client.get_messages(self._peer(source_id), limit=1)
+            top_id = head[0].id if head else 0
+            start_id = min(after_ids.values())
+            if top_id > start_id:
+                missing = 0
+                pending = []
+                for first_id in range(start_id + 1, top_id + 1, self.MAX_FORWARD_BATCH):
+                    ids = list(range(first_id, min(first_id + self.MAX_FORWARD_BATCH, top_id + 1)))
+                    await self.rate_limiter.acquire("history")
+                    batch = await client.get_messages(self._peer(source_id), ids=ids)
+                    self.rate_limiter.on_success("history")
+                    pending.extend(
+                        message
+                        for message in batch
+                        if message is not None and not isinstance(message, MessageService)
+                    )
+                    split = len(pending)
+                    if pending and ids[-1] < top_id and pending[-1].grouped_id is not None:
+                        split = self._album_start(pending, len(pending) - 1)
+                    ready, pending = pending[:split], pending[split:]
+                    ready = [
+                        message
+                        for message in ready
+                        if any(
+                            message.id > after_ids[target_id]
+                            and not self.message_index.contains(source_id, message.id, target_id)
+                            for target_id in targets
+                        )
+                    ]
+                    if ready:
+                        missing += len(ready)
+                        await self._dispatch_live(source_id, ready, after_ids)
+                if missing:
+                    self.log(
+                        f"Источник {source_id}: догоняем {missing} пропущенных сообщений "
+                        f"из диапазона {start_id + 1}-{top_id}"
+                    )
+                    self.metrics.inc("cloner_catch_up_messages_total", missing, source=source_id)
+            self._scanned_ids[source_id] = max(start_id, top_id)
+            self._unverified_sources.discard(source_id)
+            completed = True
+        finally:
+            buffered = {message.id: message for message in self._catching_up.pop(source_id)}
+            if not completed:
+                if source_id not in self._scanned_ids:
+                    self._scanned_ids[source_id] = min(
+                        self._last_id(source_id, target_id) for target_id in targets
+                    )
+                self._unverified_sources.add(source_id)
+                top_id = 0
+            late = [buffered[message_id] for message_id in sorted(buffered) if message_id > top_id]
+            if late:
+                await self._dispatch_live(source_id, late)
 
+    async def _catch_up_live_sources(self, client, source_ids: List[int] = None):
+        if source_ids is None:
+            source_ids = sorted({source_id for source_id, _ in self._live_sources})
+        for source_id in source_ids:
+            if not self.is_running:
+                return
             try:
-                await self._forward_message(client, message, target_id)
-                self._update_progress(source_key, message.id)
-                self.log(f"Скопировано сообщение {message.id} источника {source_id}")
-                await asyncio.sleep(2)
+                await self._catch_up(client, source_id)
             except FloodWaitError as flood_exc:
-                self.log(f"FloodWait: ждем {flood_exc.seconds} сек.")
-                await asyncio.sleep(flood_exc.seconds)
+                self.rate_limiter.on_flood_wait(flood_exc.seconds, "history")
+                self.log(f"FloodWait при догоне источника {source_id}: {flood_exc.seconds} сек.")
             except Exception as exc:
-                self.log(f"Ошибка при копировании сообщения {message.id}: {exc}")
-                self._update_progress(source_key, message.id)
-                await asyncio.sleep(5)
+                self.metrics.inc("cloner_errors_total", kind="catch_up")
+                self.log(f"Ошибка догона источника {source_id}: {exc}")
 
-    async def _monitor_new_posts(self, client, target_id: int, source_ids: List[int]):
+    async def _forward_live(self, source_id: int, messages, target_id: int):
+        if not self.is_running:
+            return
+        pipeline = self.live_pipelines[target_id]
+        self.metrics.set_gauge("cloner_live_queue_depth", pipeline.depth, target=target_id)
+        last_id = max(message.id for message in messages)
+        messages = [message for message in messages if not isinstance(message, FilteredOut)]
+        if messages:
+            self.log(
+                f"Новые посты из {source_id} в {target_id}: {len(messages)} "
+                f"({messages[0].id}-{messages[-1].id}), в очереди {pipeline.depth}"
+            )
+        try:
+            if not messages or await self._forward_chunk(messages, source_id, target_id):
+                self._update_progress(source_id, target_id, last_id)
+        except asyncio.CancelledError:
+            await self._checkpoint_interrupted(messages, source_id, target_id, last_id)
+            raise
+        except Exception as exc:
+            self.metrics.inc("cloner_errors_total", kind="live")
+            self.log(f"Ошибка пересылки новых постов из {source_id} в {target_id}: {exc}")
+
+    def _live_forwarder(self, target_id: int):
+        return lambda source_id, messages: self._forward_live(source_id, messages, target_id)
+
+    async def _monitor_new_posts(self, client, target_ids: List[int], source_ids: List[int]):
         self.log("Отслеживание новых постов запущено.")
-        handler = None
+        self.live_pipelines = {
+            target_id: LivePipeline(
+                self._live_forwarder(target_id),
+                workers=self.live_workers,
+                maxsize=self.live_queue_size,
+                max_batch=self.batch_size,
+            )
+            for target_id in target_ids
+        }
+        for pipeline in self.live_pipelines.values():
+            pipeline.start()
 
         async def new_message_handler(event):
+            if event.message.grouped_id is not None:
+                return
+            await self._enqueue_live([event.message])
+
+        async def album_handler(event):
+            await self._enqueue_live(event.messages)
+
+        client.add_event_handler(new_message_handler, events.NewMessage(chats=source_ids))
+        client.add_event_handler(album_handler, events.Album(chats=source_ids))
+
+        try:
+            await self._watch_connection(client)
+        finally:
+            client.remove_event_handler(new_message_handler)
+            client.remove_event_handler(album_handler)
+            for pipeline in self.live_pipelines.values():
+                await pipeline.stop()
+            self.log("Отслеживание новых постов остановлено.")
+
+    async def _watch_connection(self, client):
+        connected = True
+        last_catch_up = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), self.CONNECTION_CHECK_INTERVAL)
+                return
+            except asyncio.TimeoutError:
+                pass
+            if not client.is_connected():
+                if connected:
+                    self.log("Соединение с Telegram потеряно, ожидаем переподключения...")
+                    self._unverified_sources.update(self._scanned_ids)
+                connected = False
+                continue
+            reconnected = not connected
+            connected = True
+            if reconnected:
+                self.log("Соединение восстановлено, догоняем пропущенные посты.")
+            elif time.monotonic() - last_catch_up < self.CATCH_UP_INTERVAL:
+                continue
+            await self._catch_up_live_sources(client)
+            last_catch_up = time.monotonic()
+
+    async def _migrate_and_go_live(self, client, source_id: int, target_ids: List[int], slots):
+        async with slots:
             if not self.is_running:
                 return
-            message = event.message
-            if isinstance(message, MessageService):
+            try:
+                completed = await self._migrate_source(client, source_id, target_ids)
+            except Exception as exc:
+                self.log(f"Ошибка миграции источника {source_id}: {exc}")
                 return
-            self.log(f"Новый пост {message.id} из {event.chat_id}")
+        if self.is_running and completed:
+            self._live_sources.update((source_id, target_id) for target_id in completed)
+            targets = ", ".join(str(target_id) for target_id in completed)
+            self.log(
+                f"Архив источника {source_id} скопирован в {targets}, "
+                "включено отслеживание новых постов."
+            )
+            await self._catch_up_live_sources(client, [source_id])
+
+    async def _migrate_sources(self, client, source_ids: List[int], target_ids: List[int]):
+        slots = asyncio.Semaphore(self.parallelism)
+        await asyncio.gather(
+            *(
+                self._migrate_and_go_live(client, source, target_ids, slots)
+                for source in source_ids
+            )
+        )
+
+    async def _plan_migration(self, client, source_ids: List[int]):
+        for source_id in source_ids:
             try:
-                await self._forward_message(client, message, target_id)
-                chat_id = (
-                    message.chat_id
-                    if message.chat_id
-                    else getattr(message.peer_id, "channel_id", None)
+                await self.planner.plan_source(
+                    client,
+                    source_id,
+                    last_id=min(self._last_id(source_id, target) for target in self.target_ids),
+                    start_date=self.start_date,
+                    peer=self._peer(source_id),
                 )
-                if chat_id:
-                    self._update_progress(str(chat_id), message.id)
-            except FloodWaitError as flood_exc:
-                self.log(f"FloodWait при новом посте: {flood_exc.seconds}s.")
-                await asyncio.sleep(flood_exc.seconds)
             except Exception as exc:
-                self.log(f"Ошибка нового поста {message.id}: {exc}")
+                self.log(f"Не удалось оценить объем источника {source_id}: {exc}")
+        for line in self.planner.describe():
+            self.log(line)
 
-        handler = client.add_event_handler(
-            new_message_handler, events.NewMessage(chats=source_ids)
-        )
+    async def _resolve_peers(self, member, peer_ids: List[int]) -> Dict[int, str]:
+        errors = {}
+        for attempt in range(2):
+            errors = {}
+            for peer_id in peer_ids:
+                if peer_id in member.peers:
+                    continue
+                try:
+                    member.peers[peer_id] = await member.client.get_input_entity(peer_id)
+                except Exception as exc:
+                    errors[peer_id] = str(exc)
+            if not errors or attempt:
+                break
+            self.log(f"Аккаунт {member.name}: обновляем список диалогов для поиска каналов.")
+            await member.client.get_dialogs()
+        return errors
+
+    async def _connect_pool(self, source_ids: List[int], target_ids: List[int]):
+        self._sessions = []
+        for name in self.session_names:
+            session = name
+            if self.memory_session:
+                session = BufferedSession(name)
+                self._sessions.append(session)
+            client = TelegramClient(session, self.api_id, self.api_hash)
+            self.session_pool.add(name, client)
+            await client.connect()
+            self.log(f"Аккаунт {name}: проверка авторизации.")
+            await self._authorize(client)
+        for session in self._sessions:
+            await session.flush_async()
+            await session.start()
+
+        peer_ids = list(dict.fromkeys([*source_ids, *target_ids]))
+        primary = self.session_pool.primary
+        errors = await self._resolve_peers(primary, peer_ids)
+        if errors:
+            details = "; ".join(f"{peer_id}: {error}" for peer_id, error in errors.items())
+            raise ValueError(f"Аккаунт {primary.name} не видит каналы: {details}")
+        for member in self.session_pool.members[1:]:
+            errors = await self._resolve_peers(member, peer_ids)
+            if errors:
+                peer_id, error = next(iter(errors.items()))
+                self.log(
+                    f"Аккаунт {member.name} исключен из пула: нет доступа к {peer_id} ({error})"
+                )
+                self.session_pool.remove(member)
+                await member.client.disconnect()
 
+        names = ", ".join(member.name for member in self.session_pool.members)
+        self.log(f"Пул аккаунтов для пересылки: {names}")
+        return self.session_pool.primary.client
+
+    async def _run(self, source_ids: List[int], target_ids: List[int]):
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        self._stop_requested_at = None
+        self._in_flight = set()
+        self.target_ids = list(target_ids)
+        if not self.is_running:
+            self._stop_event.set()
+        session = asyncio.create_task(self._session(source_ids, target_ids))
+        stop_waiter = asyncio.create_task(self._stop_event.wait())
         try:
-            while self.is_running:
-                await asyncio.sleep(1)
+            await asyncio.wait({session, stop_waiter}, return_when=asyncio.FIRST_COMPLETED)
         finally:
-            if handler:
-                client.remove_event_handler(new_message_handler)
-            self.log("Отслеживание новых постов остановлено.")
+            stop_waiter.cancel()
+            session.cancel()
+            try:
+                await session
+            except asyncio.CancelledError:
+                if not self._stop_event.is_set():
+                    raise
+            finally:
+                if self._stop_requested_at is not None:
+                    latency = time.monotonic() - self._stop_requested_at
+                    self.metrics.observe("cloner_shutdown_seconds", latency)
+                    self.log(f"Остановка заняла {latency:.1f} с.")
 
-    async def _run(self, source_ids: List[int], target_id: int):
-        client = TelegramClient(self.session_name, self.api_id, self.api_hash)
-        await client.connect()
+    async def _session(self, source_ids: List[int], target_ids: List[int]):
+        self.session_pool = SessionPool(self.rate_limiter)
+        await self.checkpoints.start()
+        monitor = None
         try:
-            await self._authorize(client)
+            await self.metrics_exporter.start()
+            indexed = await self._loop.run_in_executor(None, self.message_index.open)
+            self.log(f"Индекс скопированных сообщений загружен: {indexed} записей.")
+            client = await self._connect_pool(source_ids, target_ids)
+            await self._plan_migration(client, source_ids)
 
-            for source in source_ids:
-                if not self.is_running:
-                    break
-                await self._migrate_source(client, source, target_id)
+            self._live_sources = set()
+            async with contextlib.AsyncExitStack() as stack:
+                if self.use_takeout:
+                    self._history_client = await self._open_takeout(client, stack)
+                monitor = asyncio.create_task(
+                    self._monitor_new_posts(client, target_ids, source_ids)
+                )
+                await self._migrate_sources(client, source_ids, target_ids)
+                self._history_client = None
 
             if self.is_running:
-                await self._monitor_new_posts(client, target_id, source_ids)
+                await monitor
         finally:
-            await client.disconnect()
+            self._history_client = None
+            if monitor and not monitor.done():
+                monitor.cancel()
+                await asyncio.gather(monitor, return_exceptions=True)
+            await self._drain_in_flight()
+            await self.metrics_exporter.stop()
+            await self.checkpoints.stop()
+            for member in self.session_pool.members:
+                await member.client.disconnect()
+            for session in self._sessions:
+                await session.stop()
             self.log("Соединение с Telegram закрыто.")
 
-    def start_migration(self, source_ids: List[int], target_id: int):
+    def start_migration(self, source_ids: List[int], target_ids: Union[int, List[int]]):
         if not source_ids:
             raise ValueError("Не указан ни один источник.")
+        if isinstance(target_ids, int):
+            target_ids = [target_ids]
+        if not target_ids:
+            raise ValueError("Не указан ни один получатель.")
+        self.target_ids = list(target_ids)
         self.is_running = True
         try:
-            asyncio.run(self._run(source_ids, target_id))
+            asyncio.run(self._run(source_ids, self.target_ids))
         except Exception as exc:
-            self.log(f"Критическая ошибка: {exc}")
+            self.log(f"Критическая ошибка: {exc}", logging.ERROR)
             raise
         finally:
             self.is_running = False
+            self.checkpoints.close()
+            self.message_index.close()
 
     def stop(self):
-        self.is_running = False
\ No newline at end of file
+        if self.is_running and self._stop_requested_at is None:
+            self._stop_requested_at = time.monotonic()
+        self.is_running = False
+        loop, stop_event = self._loop, self._stop_event
+        if loop and stop_event and not loop.is_closed():
+            loop.call_soon_threadsafe(stop_event.set)
\ No newline at end of file